@@ -31,9 +31,35 @@ Example of using
 
 """
 import os.path  # os.path.getsize(path)
+import mmap
+import json
+import multiprocessing
+from multiprocessing import shared_memory
+import zipfile
+import sqlite3
+import re
 import numpy as np
 import struct
+import time
+import zlib
+import lzma
+import bisect
+import abc
+import functools
+import difflib
+import http.client
+import urllib.parse
+from collections import OrderedDict
 from textwrap import wrap
+
+try: 
+    import h5py  # optional: export to HDF5
+except ImportError: 
+    h5py = None
+try: 
+    import zstandard  # optional: zstd-compressed res-files
+except ImportError: 
+    zstandard = None
 #import matplotlib.pyplot as plt
 
 ASTRA_NRD = 501
@@ -71,6 +97,186 @@ class ProfileOutOfIndex(Exception):
 
 def little_endian(type_):
     return np.dtype(type_).newbyteorder('<')
+
+_LONG = struct.Struct("<l")
+_DOUBLE2 = struct.Struct("<dd")
+_SHORT_LE = little_endian(np.int16)
+_LONG_LE = little_endian(np.int32)
+
+def decode_str(b): 
+    # works both for bytes and memoryview (without intermediate copy)
+    return str(b, 'cp1252')
+
+class MemReader: 
+    """
+    File-like reader over the buffer (bytes, mmap, ...). 
+    read() returns memoryview slices of the buffer, so no data is copied
+    """
+    def __init__(self, buf): 
+        self.buf = memoryview(buf)
+        self.size = len(self.buf)
+        self.pos = 0
+
+    def read(self, size=-1): 
+        start = self.pos
+        stop = start + size
+        if (size < 0)or(stop > self.size): 
+            stop = max(start, self.size)
+        self.pos = stop
+        return self.buf[start:stop]
+
+    def seek(self, offset, whence=ABSOLUTE_POS): 
+        if whence == RELATIVE_POS: 
+            offset += self.pos
+        elif whence == 2: 
+            offset += self.size
+        self.pos = offset
+        return self.pos
+
+    def tell(self): 
+        return self.pos
+
+    def close(self): 
+        # the buffer is released, so the mapping can be closed
+        self.buf.release()
+        self.closed = True
+
+    closed = False
+    stats = None  # see CountingMemReader
+
+#------------------------------------------------------------------------------
+
+class ParseStats: 
+    """
+    Instrumentation of the reading (ResFile(..., stats=True) or ResFile(..., hook=callback)). 
+    phases      - {phase: wall time, s} 
+    phase_bytes - {phase: bytes passed by the file position} 
+    reads, seeks, read_bytes - read()/seek() calls of the reader and the bytes returned by read() 
+    frames, profiles - numbers of the read frames and profiles 
+    probes      - {exception: n} - ProfileNotFound, NotAString, EndOfFile used to detect the ends 
+    hook(phase, stats) is called at the end of each phase and with the phase 'done' 
+    at the end of the reading
+    """
+    def __init__(self, hook=None): 
+        self.hook = hook
+        self.phases, self.phase_bytes, self.probes = {}, {}, {}
+        self.reads, self.seeks, self.read_bytes = 0, 0, 0
+        self.frames, self.profiles = 0, 0
+
+    def phase(self, name, file=None): 
+        return _StatsPhase(self, name, file)
+
+    def add_phase(self, name, seconds, nbytes=0): 
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.phase_bytes[name] = self.phase_bytes.get(name, 0) + nbytes
+        if self.hook is not None: 
+            self.hook(name, self)
+
+    def count_probe(self, name): 
+        self.probes[name] = self.probes.get(name, 0) + 1
+
+    def finish(self, frames, profiles): 
+        self.frames, self.profiles = frames, profiles
+        if self.hook is not None: 
+            self.hook('done', self)
+
+    @property
+    def total_time(self): 
+        return sum(self.phases.values())
+
+    @property
+    def total_bytes(self): 
+        return sum(self.phase_bytes.values())
+
+    @property
+    def throughput(self): 
+        # bytes per second
+        t = self.total_time
+        return self.total_bytes / t if t > 0 else 0.0
+
+    def as_dict(self): 
+        return {'phases': dict(self.phases), 'phase_bytes': dict(self.phase_bytes), 
+                'reads': self.reads, 'seeks': self.seeks, 'read_bytes': self.read_bytes, 
+                'frames': self.frames, 'profiles': self.profiles, 'probes': dict(self.probes), 
+                'total_time': self.total_time, 'throughput': self.throughput}
+
+    def __repr__(self): 
+        lines = ['%-12s %9.4f s %12d bytes' % (name, t, self.phase_bytes[name]) 
+                 for name, t in self.phases.items()]
+        lines.append('reads %d, seeks %d, frames %d, profiles %d, probes %s, %.1f MB/s' % (
+                     self.reads, self.seeks, self.frames, self.profiles, self.probes, self.throughput/1e6))
+        return '\n'.join(lines)
+
+class _StatsPhase: 
+    def __init__(self, stats, name, file): 
+        self.stats, self.name, self.file = stats, name, file
+
+    def __enter__(self): 
+        self.pos = self.file.tell() if self.file is not None else 0
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        dt = time.perf_counter() - self.t
+        nbytes = self.file.tell() - self.pos if self.file is not None else 0
+        self.stats.add_phase(self.name, dt, nbytes)
+        return False
+
+class _NoPhase: 
+    # phase when the statistics are disabled
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        return False
+
+NO_PHASE = _NoPhase()
+
+class CountingMemReader(MemReader): 
+    # MemReader that counts read() and seek() calls in stats (ParseStats)
+    def __init__(self, buf, stats): 
+        MemReader.__init__(self, buf)
+        self.stats = stats
+
+    def read(self, size=-1): 
+        result = MemReader.read(self, size)
+        self.stats.reads += 1
+        self.stats.read_bytes += len(result)
+        return result
+
+    def seek(self, offset, whence=ABSOLUTE_POS): 
+        self.stats.seeks += 1
+        return MemReader.seek(self, offset, whence)
+
+class CountingFile: 
+    # file wrapper that counts read() and seek() calls in stats (ParseStats)
+    def __init__(self, file, stats): 
+        self.file, self.stats = file, stats
+
+    def read(self, size=-1): 
+        result = self.file.read(size)
+        self.stats.reads += 1
+        self.stats.read_bytes += len(result)
+        return result
+
+    def seek(self, offset, whence=ABSOLUTE_POS): 
+        self.stats.seeks += 1
+        return self.file.seek(offset, whence)
+
+    def tell(self): 
+        return self.file.tell()
+
+    def fileno(self): 
+        return self.file.fileno()
+
+    def close(self): 
+        self.file.close()
+
+def count_probe(file, name): 
+    # exception used as the probe is counted if the reader has stats (see ParseStats)
+    stats = getattr(file, 'stats', None)
+    if stats is not None: 
+        stats.count_probe(name)
     
 def read_long(file): 
     b = file.read(4)  # ??? returns 0 if file exhausted
@@ -100,6 +306,445 @@ def dump(filename, src_file=None, size=None, data_bytes=None):
         else:
             dumpfile.write(data_bytes)
 
+class LazyList: 
+    """
+    List-like container, i-th item is created by loader(i) at the first access
+    """
+    def __init__(self, loader, count): 
+        self._loader = loader
+        self._items = [None]*count
+
+    def __len__(self): 
+        return len(self._items)
+
+    def __getitem__(self, i): 
+        if isinstance(i, slice): 
+            return [self[j] for j in range(len(self._items))[i]]
+        
+        i = range(len(self._items))[i]  # negative index, IndexError
+        item = self._items[i]
+        if item is None: 
+            item = self._loader(i)
+            self._items[i] = item
+        return item
+
+    def __iter__(self): 
+        for i in range(len(self._items)): 
+            yield self[i]
+
+    def resize(self, count): 
+        # new items are not loaded yet
+        del self._items[count:]
+        self._items.extend([None]*(count - len(self._items)))
+
+#%%   byte sources
+
+class ByteSource(abc.ABC): 
+    """
+    Random access to the bytes of the res-file: read_at(offset, length), size, name. 
+    buffer() returns the whole content as the buffer (bytes, mmap) if it is in memory, 
+    such sources are read directly (see MemReader), the others through SourceFile. 
+    The closed source is opened again at the next read_at
+    """
+    name = '<source>'
+    size = 0
+
+    @abc.abstractmethod
+    def read_at(self, offset, length): 
+        pass
+
+    def buffer(self): 
+        return None
+
+    def close(self): 
+        pass
+
+class FileSource(ByteSource): 
+    def __init__(self, filename): 
+        self.name = filename
+        self.size = os.path.getsize(filename)
+        self._file = None
+
+    def read_at(self, offset, length): 
+        if self._file is None: 
+            self._file = open(self.name, 'rb')
+        self._file.seek(offset, ABSOLUTE_POS)
+        return self._file.read(length)
+
+    def close(self): 
+        if self._file is not None: 
+            self._file.close()
+            self._file = None
+
+class BytesSource(ByteSource): 
+    def __init__(self, data, name='<bytes>'): 
+        self.name = name
+        self._data = memoryview(data)
+        self.size = len(self._data)
+
+    def read_at(self, offset, length): 
+        return self._data[offset:offset + max(length, 0)].tobytes()
+
+    def buffer(self): 
+        return self._data
+
+class MmapSource(BytesSource): 
+    # the mapping is kept as long as the source (or the arrays of the profiles) lives
+    def __init__(self, filename): 
+        with open(filename, 'rb') as f: 
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(filename) > 0 else b''
+        BytesSource.__init__(self, data, filename)
+
+class HttpSource(ByteSource): 
+    """
+    Res-file on the HTTP server with the range requests (Range: bytes=a-b). 
+    The connection is kept alive between the requests if the server allows it
+    """
+    def __init__(self, url, timeout=30.0): 
+        self.name, self.timeout = url, timeout
+        parts = urllib.parse.urlsplit(url)
+        self._https = parts.scheme == 'https'
+        self._host, self._path = parts.netloc, (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._conn = None
+        self.requests = 0
+        
+        status, headers, _ = self._request({'Range': 'bytes=0-0'})
+        if status != 206: 
+            raise AstraResError('Range requests are not supported by the server: ' + url)
+        self.size = int(headers.get('Content-Range', '').rsplit('/', 1)[-1])
+
+    def _request(self, headers): 
+        for attempt in (0, 1): # the kept connection could be closed by the server
+            if self._conn is None: 
+                cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+                self._conn = cls(self._host, timeout=self.timeout)
+            try: 
+                self._conn.request('GET', self._path, headers=headers)
+                response = self._conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError): 
+                self.close()
+                if attempt == 1: 
+                    raise
+        self.requests += 1
+        if response.will_close: 
+            self.close()
+        if response.status not in (200, 206): 
+            raise AstraResError('HTTP %d %s: %s' % (response.status, response.reason, self.name))
+        return response.status, response.headers, data
+
+    def read_at(self, offset, length): 
+        length = min(length, self.size - offset)
+        if length <= 0: 
+            return b''
+        status, headers, data = self._request({'Range': 'bytes=%d-%d' % (offset, offset + length - 1)})
+        # the whole file (200) or another range would be parsed as the bytes at offset
+        m = re.match(r'bytes (\d+)-', headers.get('Content-Range', '')) if status == 206 else None
+        if (m is None)or(int(m.group(1)) != offset)or(len(data) != length): 
+            raise AstraResError('Range request bytes=%d-%d is not served (HTTP %d): %s' % (
+                                offset, offset + length - 1, status, self.name))
+        return data
+
+    def close(self): 
+        if self._conn is not None: 
+            self._conn.close()
+            self._conn = None
+
+BLOCK_SIZE = 1 << 16
+CACHE_BLOCKS = 256
+
+class BlockCache(ByteSource): 
+    """
+    LRU cache of the aligned blocks of the source. 
+    Small reads are served by the cached blocks, missing blocks are fetched 
+    by one read_at of the source per run of the adjacent blocks. 
+    Reads bigger than the cache go directly to the source
+    """
+    def __init__(self, source, block_size=BLOCK_SIZE, max_blocks=CACHE_BLOCKS): 
+        self.source = source
+        self.name, self.size = source.name, source.size
+        self.block_size, self.max_blocks = block_size, max_blocks
+        self._blocks = OrderedDict()
+        self.hits, self.misses, self.fetches = 0, 0, 0
+
+    def read_at(self, offset, length): 
+        length = min(length, self.size - offset)
+        if length <= 0: 
+            return b''
+        bs = self.block_size
+        first, last = offset // bs, (offset + length - 1) // bs
+        if last - first + 1 > self.max_blocks: 
+            self.fetches += 1
+            return self.source.read_at(offset, length)
+        
+        missing = [i for i in range(first, last + 1) if i not in self._blocks]
+        self.misses += len(missing)
+        self.hits += last - first + 1 - len(missing)
+        j = 0
+        while j < len(missing): # runs of the adjacent missing blocks
+            k = j
+            while (k + 1 < len(missing))and(missing[k + 1] == missing[k] + 1): 
+                k += 1
+            data = self.source.read_at(missing[j]*bs, (missing[k] - missing[j] + 1)*bs)
+            self.fetches += 1
+            for n, i in enumerate(missing[j:k + 1]): 
+                self._blocks[i] = data[n*bs:(n + 1)*bs]
+            j = k + 1
+        
+        parts = []
+        for i in range(first, last + 1): 
+            self._blocks.move_to_end(i)
+            parts.append(self._blocks[i])
+        while len(self._blocks) > self.max_blocks: 
+            self._blocks.popitem(last=False)
+        
+        start = offset - first*bs
+        return b''.join(parts)[start:start + length]
+
+    def buffer(self): 
+        return self.source.buffer()
+
+    def close(self): 
+        self.source.close()
+
+def byte_source(obj): 
+    # ByteSource of the ResFile input, None for the local file name
+    if isinstance(obj, ByteSource): 
+        return obj
+    if isinstance(obj, (bytes, bytearray, memoryview)): 
+        return BytesSource(obj)
+    if isinstance(obj, str) and obj.startswith(('http://', 'https://')): 
+        return BlockCache(HttpSource(obj))
+    return None
+
+class SourceFile: 
+    # read-only file (read, seek, tell) over the ByteSource
+    def __init__(self, source): 
+        self.source = source
+        self.pos = 0
+
+    def read(self, size=-1): 
+        if (size is None)or(size < 0): 
+            size = self.source.size - self.pos
+        b = self.source.read_at(self.pos, size)
+        self.pos += len(b)
+        return b
+
+    def seek(self, offset, whence=ABSOLUTE_POS): 
+        if whence == RELATIVE_POS: 
+            offset += self.pos
+        elif whence == 2: 
+            offset += self.source.size
+        self.pos = offset
+        return self.pos
+
+    def tell(self): 
+        return self.pos
+
+    def close(self): 
+        self.source.close()
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        self.close()
+
+#%%   compressed input
+
+COMPRESSION_MAGIC = [(b'\x1f\x8b', 'gzip'), (b'\xfd7zXZ\x00', 'xz'), (b'\x28\xb5\x2f\xfd', 'zstd')]
+
+_COMPRESSED_CHUNK = 1 << 18  # compressed bytes decompressed at once
+CHECKPOINT_STEP = 1 << 22    # decompressed bytes between the checkpoints of gzip
+_REWIND = 1 << 22            # decompressed bytes kept before the position
+
+def detect_compression(filename): 
+    # 'gzip', 'xz', 'zstd' (by the magic bytes) or None. filename can be ByteSource
+    if isinstance(filename, ByteSource): 
+        head = filename.read_at(0, 8)
+    else: 
+        with open(filename, 'rb') as f: 
+            head = f.read(8)
+    for magic, kind in COMPRESSION_MAGIC: 
+        if head.startswith(magic): 
+            return kind
+    return None
+
+def open_res_file(filename, compression=None): 
+    # file object of the res-file given by the name or ByteSource
+    source = byte_source(filename)
+    if compression is not None: 
+        return CompressedFile(FileSource(filename) if source is None else source, compression)
+    return open(filename, 'rb') if source is None else SourceFile(source)
+
+class CompressedFile: 
+    """
+    Read-only file (read, seek, tell) over the decompressed content of gzip, xz or zstd file. 
+    The decompressed data around the position are kept in the buffer (_REWIND bytes back), 
+    forward seeks decompress the data and drop them, 
+    seeks out of the buffer restart the decompression from the nearest point before the position: 
+    seek_points - [(output pos, input pos)] starts of the gzip members, xz streams and zstd frames, 
+        the decompression starts there from scratch. They are found while reading 
+        and kept in the sidecar index (see save_index_cache), add_seek_points() restores them. 
+        Usual gzip/xz/zstd file has only one point (the beginning), 
+        the files of compress_res_file() have one per member_size bytes. 
+    checkpoints - copies of the decompressor state every CHECKPOINT_STEP bytes, gzip only, 
+        in memory of this object only (the state of zlib can not be saved). 
+    decompressed - total number of the decompressed bytes. 
+    source: compressed bytes (see ByteSource)
+    """
+    def __init__(self, source, kind): 
+        if (kind == 'zstd')and(zstandard is None): 
+            raise AstraResError('zstandard is required to read zstd-compressed ' + str(source.name))
+        self.source, self.kind = source, kind
+        self.size = None  # decompressed size, known after the end is reached
+        self.pos = 0
+        self.decompressed = 0
+        self.seek_points, self._seek_pos = [(0, 0)], [0]
+        self._checkpoints, self._checkpoint_pos = [], []  # (output pos, input pos, decompressor)
+        self._start(0, 0, self._decompressor())
+
+    def _decompressor(self): 
+        if self.kind == 'gzip': 
+            return zlib.decompressobj(zlib.MAX_WBITS | 16)  # with gzip header
+        elif self.kind == 'xz': 
+            return lzma.LZMADecompressor()
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def add_seek_points(self, points): 
+        # (output pos, input pos) of the member starts, e.g. from the sidecar index
+        for out_pos, in_pos in points: 
+            i = bisect.bisect_left(self._seek_pos, out_pos)
+            if (i == len(self._seek_pos))or(self._seek_pos[i] != out_pos): 
+                self._seek_pos.insert(i, int(out_pos))
+                self.seek_points.insert(i, (int(out_pos), int(in_pos)))
+
+    def _start(self, out_pos, in_pos, decompressor): 
+        self._d = decompressor
+        self._buf = bytearray()
+        self._buf_start = self._out_pos = out_pos
+        self._in_pos = in_pos
+        self._eof = False
+
+    def _nearest(self, target): 
+        # the nearest point before the target: (output pos, input pos, decompressor or None)
+        i = bisect.bisect_right(self._checkpoint_pos, target) - 1
+        j = bisect.bisect_right(self._seek_pos, target) - 1
+        if (i >= 0)and(self._checkpoint_pos[i] > self._seek_pos[j]): 
+            return self._checkpoints[i]
+        return self.seek_points[j] + (None,)
+
+    def _restart(self, target): 
+        out_pos, in_pos, d = self._nearest(target)
+        self._start(out_pos, in_pos, self._decompressor() if d is None else d.copy())
+
+    def _feed(self): 
+        chunk = self.source.read_at(self._in_pos, _COMPRESSED_CHUNK)
+        if len(chunk) == 0: 
+            self._eof = True
+            self.size = self._out_pos
+            return
+        out = b''
+        while len(chunk) > 0: 
+            if getattr(self._d, 'eof', False): # next member of the file
+                self.add_seek_points([(self._out_pos + len(out), self._in_pos)])
+                self._d = self._decompressor()
+            out += self._d.decompress(chunk)
+            rest = self._d.unused_data if getattr(self._d, 'eof', False) else b''
+            self._in_pos += len(chunk) - len(rest)
+            chunk = rest
+        
+        self._buf += out
+        self._out_pos += len(out)
+        self.decompressed += len(out)
+        drop = self.pos - _REWIND - self._buf_start
+        if drop > _REWIND: 
+            drop = min(drop, len(self._buf))
+            del self._buf[0:drop]
+            self._buf_start += drop
+        
+        last = self._checkpoint_pos[-1] if self._checkpoint_pos else 0
+        if (self.kind == 'gzip')and(self._out_pos - last >= CHECKPOINT_STEP): 
+            self._checkpoints.append((self._out_pos, self._in_pos, self._d.copy()))
+            self._checkpoint_pos.append(self._out_pos)
+
+    def read(self, size=-1): 
+        start = self.pos - self._buf_start
+        if (0 <= start)and(0 <= size <= len(self._buf) - start): # in the buffer
+            self.pos += size
+            return bytes(self._buf[start:start + size])
+        
+        if (self.pos < self._buf_start)or(self._nearest(self.pos)[0] > self._out_pos): 
+            self._restart(self.pos)
+        stop = None if (size is None)or(size < 0) else self.pos + size
+        while (not self._eof)and((stop is None)or(self._out_pos < stop)): 
+            self._feed()
+        stop = self._out_pos if stop is None else min(stop, self._out_pos)
+        start = self.pos
+        if start >= stop: 
+            return b''
+        self.pos = stop
+        return bytes(self._buf[start - self._buf_start:stop - self._buf_start])
+
+    def seek(self, offset, whence=ABSOLUTE_POS): 
+        if whence == RELATIVE_POS: 
+            offset += self.pos
+        elif whence == 2: 
+            while not self._eof: 
+                self._feed()
+            offset += self.size
+        self.pos = offset
+        return self.pos
+
+    def tell(self): 
+        return self.pos
+
+    def close(self): 
+        self.source.close()
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        self.close()
+
+COMPRESSION_EXT = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+
+def _compress_member(data, kind): 
+    # independent gzip member, xz stream or zstd frame
+    if kind == 'gzip': 
+        c = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return c.compress(data) + c.flush()
+    elif kind == 'xz': 
+        return lzma.compress(data)
+    return zstandard.ZstdCompressor().compress(data)
+
+def compress_res_file(filename, dest=None, kind='gzip', member_size=CHECKPOINT_STEP): 
+    """
+    Writes the compressed res-file as the sequence of the independent gzip members 
+    (xz streams, zstd frames) of member_size decompressed bytes each. 
+    It is the usual gzip (xz, zstd) file, but CompressedFile can start the decompression 
+    at any member, so the lazy frames and the time_range of the reopened file 
+    (with the sidecar index) decompress at most about member_size bytes before the frame. 
+    dest: name of the compressed file (filename + .gz, .xz, .zst by default). 
+    Returns dest
+    """
+    filename = os.fspath(filename)
+    if kind not in COMPRESSION_EXT: 
+        raise AstraResError('Unknown compression ' + str(kind))
+    if (kind == 'zstd')and(zstandard is None): 
+        raise AstraResError('zstandard is required to write zstd-compressed ' + filename)
+    dest = filename + COMPRESSION_EXT[kind] if dest is None else os.fspath(dest)
+    with open(filename, 'rb') as src, open(dest + '.tmp', 'wb') as f: 
+        while True: 
+            data = src.read(member_size)
+            if len(data) == 0: 
+                break
+            f.write(_compress_member(data, kind))
+    os.replace(dest + '.tmp', dest)
+    return dest
+
 #%%   specific read utils
     
 def read_packet_size(file, previous=None, max_size=None):
@@ -118,6 +763,15 @@ def _read_packet(file):
     _ = read_packet_size(file, N)
     return b
 
+def skip_packet(file): 
+    N = read_packet_size(file)
+    file.seek(N, RELATIVE_POS)
+    try: 
+        _ = read_packet_size(file, N)
+    except EndOfFile: 
+        raise AstraResError('Unexpected end of the file inside the packet')
+    return N
+
 def read_str_packet(file): 
     N = read_packet_size(file)  # 4 bytes   packet size
     L = read_byte(file)         # 1 byte    string length 
@@ -128,14 +782,14 @@ def read_str_packet(file):
     b = file.read(L)
 
     _ = read_packet_size(file, N)
-    return b.decode('cp1252')
+    return decode_str(b)
 
 def read_signature_packet(file): 
     N = read_packet_size(file, None, 32) # to prevent problems with files of other formats
     b = file.read(N)
     _ = read_packet_size(file, N)
 
-    s = b.decode('cp1252')
+    s = decode_str(b)
     if s != ASTRA_RES_SIGNATURE: 
         raise AstraResError('Signature not found in the beginning of the file')
     return s
@@ -162,41 +816,143 @@ def read_packet(file, dtype):
     elif dtype == 'double[]': 
         arr_len = len(b) // 8
         #return np.frombuffer(b, np.float64, arr_len)
-        return np.frombuffer(b, little_endian(np.float64), arr_len)
+        return np.frombuffer(bytes(b), little_endian(np.float64), arr_len)  # not pinned to the mapping
 
 def read_bin(file, dtype, length): 
     if dtype == 'str': 
-        return file.read(length*1).decode('cp1252')
+        return decode_str(file.read(length*1))
 
     elif dtype == 'char[4][]':
-        s = file.read(length*4).decode('cp1252')
+        s = decode_str(file.read(length*4))
         return wrap(s, 4)     # [s[i:i+3] for i in range(0, len(s), 3)]
     elif dtype == 'char[6][]':
-        s = file.read(length*6).decode('cp1252')   #, errors='ignore')
+        s = decode_str(file.read(length*6))   #, errors='ignore')
         return wrap(s, 6)     
 
-    elif dtype == 'long[]':
-        b = file.read(length*4)
+    elif dtype == 'long[]':    # small arrays are copied from the mapping (see MemReader)
+        b = bytes(file.read(length*4))
         return np.frombuffer(b, little_endian(np.int32), length)
     elif dtype == 'short[]':
         b = file.read(length*2)
         return np.frombuffer(b, little_endian(np.int16), length)
 
     elif dtype == 'double[]':
-        b = file.read(length*8)
+        b = bytes(file.read(length*8))
         return np.frombuffer(b, little_endian(np.float64), length)
     elif dtype == 'float[]':
-        b = file.read(length*4)
+        b = bytes(file.read(length*4))
         return np.frombuffer(b, little_endian(np.float32), length)
 
 
 #%%  Res file structure objects
 
 def _convert(x, down, scale):
-    return down + (32768 + x)*scale/65535.0
+    return down + (32768 + x.astype(np.int32))*scale/65535.0
+
+class ProfileDecoding: 
+    """
+    How the int16 codes of the profiles are converted to the float values. 
+    lazy:  only the codes (raw_array) and scale/down are kept, 
+           the values are calculated at the first access of ResProfile.array
+    dtype: float type of the values
+    cache: keep the calculated values (otherwise they are calculated at each access)
+    packed: the profiles of the frame are kept as the buffer of their packets, 
+           ResProfile is created at the access (see PackedProfiles)
+    """
+    def __init__(self, lazy=False, dtype=np.float64, cache=True, packed=False): 
+        self.lazy = lazy
+        self.dtype = np.dtype(dtype)
+        self.cache = cache
+        self.packed = packed
+
+    def convert(self, x, down, scale): 
+        result = _convert(x, down, scale)
+        if result.dtype != self.dtype: 
+            result = result.astype(self.dtype)
+        return result
+
+DEFAULT_DECODING = ProfileDecoding()
+
+_BULK_CHUNK = 1 << 22  # number of the values converted at once
+_CACHE_BLOCK = 1 << 16  # number of the values interpolated or compared at once (fits in the cache)
+
+def dequantize_profiles(profiles, dtype=np.float64): 
+    """
+    Float values of many profiles, the same as _convert for each of them, 
+    but the int16 codes and the coefficients of the profiles are gathered 
+    and converted by one broadcasted operation (per chunk of ~4M values). 
+    Returns the flat array of the values (profiles one after another) 
+    and the bounds of the profiles in it
+    """
+    lengths = np.array([len(p.raw_array) for p in profiles], dtype=np.int64)
+    downs = np.array([p.down for p in profiles], dtype=np.float64)
+    scales = np.array([p.scale for p in profiles], dtype=np.float64)
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    
+    result = np.empty(bounds[-1], dtype)
+    i = 0
+    while i < len(profiles): 
+        j = max(i + 1, np.searchsorted(bounds, bounds[i] + _BULK_CHUNK, 'right') - 1)
+        raw = np.concatenate([p.raw_array for p in profiles[i:j]])
+        result[bounds[i]:bounds[j]] = _convert(raw, np.repeat(downs[i:j], lengths[i:j]), 
+                                                    np.repeat(scales[i:j], lengths[i:j]))
+        i = j
+    return result, bounds
+
+def profile_packet_heads(buf, pos): 
+    # numbers of the codes and the coefficients (n x 2: scale, down) 
+    # of the profile packets at the positions pos of buf
+    head = np.frombuffer(buf, np.uint8)[pos[:, None] + np.arange(4 + 2*8)]
+    sizes = head[:, 0:4].copy().view(_LONG_LE)[:, 0].astype(np.int64)
+    return (sizes - 2*8) // 2, head[:, 4:].copy().view(little_endian(np.float64))
+
+def dequantize_packets(buf, pos, dtype=np.float64): 
+    """
+    The same as dequantize_profiles, but for the profile packets at the positions pos of buf 
+    (see ResFrameIndex.profile_pos): sizes, coefficients and codes are gathered 
+    from the buffer directly, without ResProfile objects. 
+    Returns the flat array of the values and the bounds of the profiles in it
+    """
+    pos = np.asarray(pos, dtype=np.int64)
+    lengths, coefs = profile_packet_heads(buf, pos)
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    # codes are read through the view of the buffer with the parity of their position
+    starts = pos + 4 + 2*8
+    size = len(memoryview(buf).cast('B'))
+    views = [np.frombuffer(buf, _SHORT_LE, size // 2), np.frombuffer(buf, _SHORT_LE, (size - 1) // 2, 1)]
+    
+    result = np.empty(bounds[-1], dtype)
+    i = 0
+    while i < len(pos): 
+        j = max(i + 1, np.searchsorted(bounds, bounds[i] + _BULK_CHUNK, 'right') - 1)
+        n = lengths[i:j]
+        index = np.repeat(starts[i:j] // 2 - bounds[i:j], n) + np.arange(bounds[i], bounds[j])
+        odd = np.repeat(starts[i:j] % 2 == 1, n)
+        raw = np.empty(len(index), _SHORT_LE)
+        raw[~odd] = views[0][index[~odd]]
+        raw[odd] = views[1][index[odd]]
+        result[bounds[i]:bounds[j]] = _convert(raw, np.repeat(coefs[i:j, 1], n), np.repeat(coefs[i:j, 0], n))
+        i = j
+    return result, bounds
+
+def profile_arrays(profiles, decoding=DEFAULT_DECODING): 
+    # float values of the profiles, not yet converted ones are converted at once 
+    todo = [p for p in profiles if p._array is None]
+    values, bounds = dequantize_profiles(todo, decoding.dtype)
+    for p, a, b in zip(todo, bounds[:-1], bounds[1:]): 
+        p._array = values[a:b]   # views of one buffer
+    return [p._array for p in profiles]
 
 class ResProfile: 
-    def __init__(self, file): 
+    __slots__ = ('decoding', 'scale', 'down', 'raw_array', '_array')  # there are a lot of profiles
+
+    def __init__(self, file, decoding=DEFAULT_DECODING): 
+        self.decoding = decoding
+        self._array = None
+        if isinstance(file, MemReader): 
+            self._init_from_buffer(file)
+            return
+
         packet_size = read_packet_size(file)
         
         if packet_size == 4: # start of new Frame !!!
@@ -208,43 +964,453 @@ class ResProfile:
          
         n = (packet_size - 2*8) // 2    # 8 = sizeof(double)
         self.raw_array = read_bin(file, 'short[]', n)
-        self.array = np.empty(len(self.raw_array), dtype=little_endian(np.float64))
-        self.array = _convert(self.raw_array, self.down, self.scale)
+        if not decoding.lazy: 
+            self._array = decoding.convert(self.raw_array, self.down, self.scale)
 
         _ = read_packet_size(file, packet_size)
 
+    def _init_from_buffer(self, reader): 
+        # the same as above, but decoded directly from the buffer 
+        # without the intermediate read() calls
+        buf, pos = reader.buf, reader.pos
+        if pos >= reader.size: 
+            raise EndOfFile
+        
+        packet_size = _LONG.unpack_from(buf, pos)[0]
+        if packet_size == 4: # start of new Frame !!!
+            raise ProfileNotFound
+
+        self.scale, self.down = _DOUBLE2.unpack_from(buf, pos + 4)
+
+        n = (packet_size - 2*8) // 2    # 8 = sizeof(double)
+        self.raw_array = np.frombuffer(buf, _SHORT_LE, n, pos + 4 + 2*8)
+        if not self.decoding.lazy: 
+            self._array = self.decoding.convert(self.raw_array, self.down, self.scale)
+
+        reader.seek(pos + 4 + packet_size)
+        _ = read_packet_size(reader, packet_size)
+
+    @property
+    def array(self): 
+        if self._array is not None: 
+            return self._array
+        
+        result = self.decoding.convert(self.raw_array, self.down, self.scale)
+        if self.decoding.cache: 
+            self._array = result
+        return result
+
+    @array.setter
+    def array(self, value): 
+        self._array = value
+
+def _skipped_profile(): 
+    # placeholder of the unrequested profile (see Projection): no codes, no values
+    p = ResProfile.__new__(ResProfile)
+    p.decoding, p.scale, p.down = DEFAULT_DECODING, np.nan, np.nan
+    p.raw_array, p._array = np.zeros(0, _SHORT_LE), np.zeros(0)
+    return p
+
+SKIPPED_PROFILE = _skipped_profile()
+
+def skip_profile_packet(file): 
+    # skips the packet of the profile without reading its data. 
+    # Raises ProfileNotFound at the start of the new frame (as ResProfile)
+    if isinstance(file, MemReader): 
+        if file.pos >= file.size: 
+            raise EndOfFile
+        packet_size = _LONG.unpack_from(file.buf, file.pos)[0]
+        if packet_size == 4: 
+            raise ProfileNotFound
+        file.seek(file.pos + 4 + packet_size)
+    else: 
+        packet_size = read_packet_size(file)
+        if packet_size == 4: 
+            file.seek(-4, RELATIVE_POS)
+            raise ProfileNotFound
+        file.seek(packet_size, RELATIVE_POS)
+    try: 
+        _ = read_packet_size(file, packet_size)
+    except EndOfFile: 
+        raise AstraResError('Unexpected end of the file inside the packet')
+
+class Projection: 
+    """
+    Profiles and signals to be read (see ResFile(profiles=..., signals=...)). 
+    profiles: bool mask of the profile positions in the frame (None - all), 
+              the unrequested profiles are skipped and replaced by SKIPPED_PROFILE, 
+              so the positions of the others are kept 
+    signals:  columns of the time slices to be kept (None - all)
+    """
+    def __init__(self, profiles=None, signals=None): 
+        self.profiles = profiles
+        self.signals = signals
+
+    def keeps_profile(self, k): 
+        return (self.profiles is None)or((k < len(self.profiles))and(bool(self.profiles[k])))
+
+    def slice_signals(self, merged_slices, nslices): 
+        # time slices (nslices x n_columns), only the requested columns are copied
+        N = len(merged_slices) // nslices
+        rows = merged_slices[0:N*nslices].reshape(nslices, N)
+        if self.signals is None: 
+            return rows
+        return rows[:, self.signals[self.signals < N]]
+
+ALL_DATA = Projection()
+
+class PackedProfiles: 
+    """
+    Profiles of one frame (see ProfileDecoding.packed): the packets stay in the buffer 
+    of the file (mapping or block), only the positions of the codes and the coefficients 
+    are kept as arrays. ResProfile (raw_array is the view of the buffer) is created 
+    at the first access, so there are no objects per profile while they are not used
+    """
+    def __init__(self, reader, decoding=DEFAULT_DECODING, projection=ALL_DATA): 
+        pos = _scan_profile_packets_mem(reader)
+        lengths, self.coefs = profile_packet_heads(reader.buf, pos)
+        if projection.profiles is not None: 
+            keep = np.array([projection.keeps_profile(k) for k in range(len(pos))], dtype=bool)
+            lengths[~keep] = -1   # SKIPPED_PROFILE
+        self.buf, self.decoding = reader.buf, decoding
+        self.codes = np.stack([pos + 4 + 2*8, lengths], axis=1)   # start, length
+
+    def __len__(self): 
+        return len(self.codes)
+
+    def __call__(self, k): 
+        start, n = self.codes[k]
+        if n < 0: 
+            return SKIPPED_PROFILE
+        p = ResProfile.__new__(ResProfile)
+        p.decoding, p._array = self.decoding, None
+        p.scale, p.down = float(self.coefs[k, 0]), float(self.coefs[k, 1])
+        p.raw_array = np.frombuffer(self.buf, _SHORT_LE, n, start)
+        if not self.decoding.lazy: 
+            p._array = self.decoding.convert(p.raw_array, p.down, p.scale)
+        return p
+
 #------------------------------------------------------------------------------
 
 class ResFrame:     
-    def __init__(self, file):    #def __init__(self, file, nprof): 
+    def __init__(self, file, index=None, decoding=DEFAULT_DECODING, projection=ALL_DATA):    #def __init__(self, file, nprof): 
+        if index is not None: # lazy frame: the profiles are decoded on demand
+            file.seek(index.pos, ABSOLUTE_POS)
+            self.pos = index.pos
+            self._read_time_part(file, projection)
+            self.profiles = LazyList(lambda i: read_profile_at(file, index.profile_pos[i], decoding) 
+                                               if projection.keeps_profile(i) else SKIPPED_PROFILE, 
+                                     len(index.profile_pos))
+            return
+
+        self.pos = file.tell()
+        self._read_time_part(file, projection)
+
+        # ------ profiles -----
+        if decoding.packed and isinstance(file, MemReader): 
+            packed = PackedProfiles(file, decoding, projection)
+            self.profiles = LazyList(packed, len(packed))
+            return
+        self.profiles = []
+        
+        #for _ in range(nprof): 
+        while True: 
+            try: 
+                if projection.keeps_profile(len(self.profiles)): 
+                    prof = ResProfile(file, decoding)
+                else: # seek past the packet
+                    skip_profile_packet(file)
+                    prof = SKIPPED_PROFILE
+                self.profiles.append(prof)
+            except ProfileNotFound:    # in version 7 can be 6 or 7 unnamed profiles ???
+                count_probe(file, 'ProfileNotFound')
+                break # New Frame starts
+            except EndOfFile: 
+                count_probe(file, 'EndOfFile')
+                break
+
+    def _read_time_part(self, file, projection=ALL_DATA): 
         # ------ 0, 1 or several slices of time signals -----
         # each with its own time instant
         nslices = read_packet(file, 'long')
 
         if nslices > 0: 
             merged_slices = read_packet(file, 'double[]')
-            N = len(merged_slices) // nslices
-            self.time_slices = [np.array(merged_slices[i*N:i*N+N]) for i in range(nslices)]
+            self.time_slices = [np.array(row) for row in projection.slice_signals(merged_slices, nslices)]
         else: 
             self.time_slices = []
 
         self.prof_time_stamp = read_packet(file, 'double') 
         self.const_values = read_packet(file, 'double[]')
-        self.unknown_packet = read_packet(file, '?') #  usually filled with zero except the first byte 
+        self.unknown_packet = bytes(read_packet(file, '?')) #  usually filled with zero except the first byte 
 
-        # ------ profiles -----
-        self.profiles = []
+def read_profile_at(file, pos, decoding=DEFAULT_DECODING): 
+    if getattr(file, 'closed', False): 
+        raise AstraResError('ResFile is closed')
+    file.seek(pos, ABSOLUTE_POS)
+    return ResProfile(file, decoding)
+
+#------------------------------------------------------------------------------
+
+class ResFrameIndex: 
+    """
+    Positions of the packets of one frame. 
+    Only the packet sizes are read, the profiles are not decoded
+    """
+    def __init__(self, file): 
+        self.pos = file.tell()
+        self.nslices = read_packet(file, 'long')
         
-        #for _ in range(nprof): 
-        while True: 
-            try: 
-                prof = ResProfile(file)
-                self.profiles.append(prof)
-            except ProfileNotFound:    # in version 7 can be 6 or 7 unnamed profiles ???
-                break # New Frame starts
-            except EndOfFile: 
-                break
+        if self.nslices > 0: 
+            merged_slices = read_packet(file, 'double[]')
+            N = len(merged_slices) // self.nslices
+            self.slice_times = np.array(merged_slices[0:N*self.nslices:N])
+        else: 
+            self.slice_times = np.zeros(0)
+
+        self.prof_time_stamp = read_packet(file, 'double') 
+        _ = skip_packet(file)   # const_values
+        _ = skip_packet(file)   # unknown_packet
+        
+        self.profile_pos = scan_profile_packets(file)
+        self.end = file.tell()
 
+def scan_profile_packets(file): 
+    # returns the positions of the profile packets up to the start of the next frame
+    if isinstance(file, MemReader): 
+        return _scan_profile_packets_mem(file)
+    
+    result = []
+    while True: 
+        pos = file.tell()
+        try: 
+            packet_size = read_packet_size(file)
+        except EndOfFile: 
+            break
+        file.seek(pos, ABSOLUTE_POS)
+        if packet_size == 4: # start of new Frame
+            break
+        _ = skip_packet(file)
+        result.append(pos)
+    return np.array(result, dtype=np.int64)
+
+_SCAN_RUN = 256  # max number of the packets checked at once (more than profiles in frame)
+
+def _scan_profile_packets_mem(reader): 
+    # All the profiles of the frame usually have the same length, 
+    # so the packets are checked by runs of equal size without the python loop over the profiles
+    result = []
+    buf, pos, size = reader.buf, reader.pos, reader.size
+    while pos + 4 <= size: 
+        packet_size = _LONG.unpack_from(buf, pos)[0]
+        if packet_size == 4: # start of new Frame
+            break
+        
+        step = packet_size + 8
+        k = min((size - pos) // step, _SCAN_RUN) if step > 8 else 0
+        if k > 0: 
+            heads = np.ndarray((k,), _LONG_LE, buf, pos, (step,))
+            tails = np.ndarray((k,), _LONG_LE, buf, pos + 4 + packet_size, (step,))
+            wrong = np.flatnonzero((heads != packet_size)|(tails != packet_size))
+            if len(wrong) > 0: 
+                k = int(wrong[0])
+                
+        if k == 0: # something wrong: let the general code raise the proper exception
+            reader.seek(pos)
+            _ = skip_packet(reader)
+            k = 1
+            
+        result.append(pos + step*np.arange(k, dtype=np.int64))
+        pos += step*k
+    
+    reader.seek(pos)
+    return np.concatenate(result) if result else np.zeros(0, dtype=np.int64)
+
+def read_frame_list(file, indexed=False, decoding=DEFAULT_DECODING, projection=ALL_DATA): 
+    # reads the frames up to the end of the file. 
+    # Returns the list of frames (or ResFrameIndex) and the exception that stopped the reading 
+    # (None if the end of file is reached). 
+    # The file position is left at the beginning of the first unread frame 
+    result = []
+    while True: 
+        pos = file.tell()
+        try: 
+            if indexed: 
+                frame = ResFrameIndex(file)
+            else: 
+                # frame = ResFrame(file, len(self.rad_names)) # ??? I don't know the exact number of the unnamed profiles 
+                frame = ResFrame(file, decoding=decoding, projection=projection) 
+            result.append(frame)
+        except EndOfFile:
+            count_probe(file, 'EndOfFile')
+            file.seek(pos, ABSOLUTE_POS)
+            return result, None   #OK
+        except BaseException as e: 
+            file.seek(pos, ABSOLUTE_POS)
+            return result, e
+
+_STREAM_BLOCK = 1 << 24  # bytes of the sequential file decoded at once (more than one frame)
+
+def _shift_frame(frame, offset): 
+    # positions of the frame (or ResFrameIndex) decoded from the block of the file
+    frame.pos += offset
+    if isinstance(frame, ResFrameIndex): 
+        frame.end += offset
+        frame.profile_pos = frame.profile_pos + offset
+
+def read_frame_blocks(file, indexed=False, decoding=DEFAULT_DECODING, projection=ALL_DATA): 
+    """
+    The same as read_frame_list for the sequential file (see CompressedFile): 
+    the file is read by big blocks and the frames are decoded from the memory (see MemReader), 
+    the arrays of the profiles refer to the blocks. 
+    The last frame of the block could be incomplete, so it is decoded again with the next block
+    """
+    result = []
+    start = file.tell()
+    data = b''
+    while True: 
+        chunk = file.read(_STREAM_BLOCK)
+        data = bytes(data) + chunk
+        reader = MemReader(data)
+        frames, error = read_frame_list(reader, indexed, decoding, projection)
+        last = len(chunk) == 0
+        if (error is not None)and(len(data) - reader.tell() > _STREAM_BLOCK): # not the cut of the block
+            last = True
+        if (not last)and(error is None)and(len(frames) > 0): 
+            reader.seek(frames.pop().pos)  # the frame could be cut by the end of the block
+        for frame in frames: 
+            _shift_frame(frame, start)
+        result.extend(frames)
+        if last: 
+            file.seek(start + reader.tell())
+            return result, error
+        data = reader.buf[reader.tell():]
+        start += reader.tell()
+
+def find_last_frame(reader, start): 
+    """
+    Index (ResFrameIndex) of the last frame found by walking backward 
+    over the packet trailers from the end of the buffer down to start. 
+    The candidate frame is validated by reading it forward up to the end. 
+    Returns None if it is not found (e.g. the last frame is not written completely)
+    """
+    buf, end = reader.buf, reader.size
+    pos = end
+    while pos - 8 >= start: 
+        size = _LONG.unpack_from(buf, pos - 4)[0]
+        head = pos - 8 - size
+        if (size < 0)or(head < start)or(_LONG.unpack_from(buf, head)[0] != size): 
+            return None
+        pos = head
+        if size == 4: # probably the start of the frame
+            reader.seek(pos)
+            try: 
+                index = ResFrameIndex(reader)
+                if index.end == end: 
+                    return index
+            except Exception: 
+                pass
+    return None
+
+_FRAME_MARK = struct.pack('<l', 4)  # packet with the number of the slices starts the frame
+_WINDOW_SCAN = 1 << 16   # the rest of the binary search is done by the sequential reading
+_SEARCH_CHUNK = 1 << 16  # bytes copied at once for the search of the frame start in the view
+
+def find_frame_start(reader, start, stop, file_end=True): 
+    """
+    First frame (ResFrameIndex) that starts in [start, stop) of the MemReader buffer. 
+    Candidates are found by the search of the packet with the number of the slices 
+    and are validated by reading the frame up to the start of the next one 
+    (or up to the end of the buffer if it is the end of the file). 
+    Returns None if there is no such frame
+    """
+    buf, size = reader.buf, reader.size
+    end = min(stop + 12, size)
+    if hasattr(buf.obj, 'find')and(buf.nbytes == len(buf.obj)): # the whole bytes or mmap: searched in place
+        data, data_start = buf.obj, 0
+    else: # the view with an offset: searched by the copied chunks
+        data, data_start = b'', start
+    pos = start
+    while True: 
+        p = data.find(_FRAME_MARK, max(pos - data_start, 0), end - data_start)
+        if p < 0: 
+            if data_start + len(data) >= end: 
+                return None
+            # the next chunk overlaps the previous one by the length of the mark
+            data_start = max(pos, data_start + len(data) - len(_FRAME_MARK) + 1)
+            data = bytes(buf[data_start:min(data_start + _SEARCH_CHUNK, end)])
+            continue
+        p += data_start
+        if p >= stop: 
+            return None
+        if buf[p+8:p+12] == _FRAME_MARK: 
+            reader.seek(p)
+            try: 
+                index = ResFrameIndex(reader)
+                if (file_end and index.end == size)or(buf[index.end:index.end+4] == _FRAME_MARK): 
+                    return index
+            except Exception: 
+                pass
+        pos = p + 1
+
+def find_window_start(reader, start, t0): 
+    """
+    Position of the first frame with prof_time_stamp >= t0 (or None) 
+    found by the binary search over the byte offsets from start to the end of the buffer. 
+    Time stamps of the frames must increase
+    """
+    # frames starting before lo have t < t0, frames starting after hi have t >= t0
+    lo, hi = start, reader.size
+    while hi - lo > _WINDOW_SCAN: 
+        mid = (lo + hi) // 2
+        index = find_frame_start(reader, mid, hi)
+        if index is None: 
+            hi = mid
+        elif index.prof_time_stamp < t0: 
+            lo = index.end
+        else: 
+            hi = index.pos
+    
+    index = find_frame_start(reader, lo, reader.size)
+    while index is not None: 
+        if index.prof_time_stamp >= t0: 
+            return index.pos
+        reader.seek(index.end)
+        try: 
+            index = ResFrameIndex(reader)
+        except Exception: 
+            return None
+    return None
+
+def find_window_probe(file, start, size, t0, probe): 
+    """
+    The same binary search as in find_window_start for the file without the buffer (see SourceFile), 
+    only probe bytes (more than two frames) are read at each step. 
+    Returns the position of the frame, the first frame with prof_time_stamp >= t0 
+    is found by the sequential reading from it
+    """
+    lo, hi = start, size
+    while hi - lo > probe: 
+        mid = (lo + hi) // 2
+        file.seek(mid, ABSOLUTE_POS)
+        data = file.read(min(probe, size - mid))
+        index = find_frame_start(MemReader(data), 0, len(data), mid + len(data) == size)
+        if index is None: 
+            hi = mid
+        elif index.prof_time_stamp < t0: 
+            lo = mid + index.end
+        else: 
+            hi = mid + index.pos
+    return lo
+
+def read_tail_frame(file, start, size, frame_size): 
+    # the last frame (see find_last_frame) of the file without the buffer: only the tail is read
+    tail = max(start, size - max(4*frame_size, 1 << 16))
+    file.seek(tail, ABSOLUTE_POS)
+    index = find_last_frame(MemReader(file.read(size - tail)), 0)
+    if index is not None: 
+        _shift_frame(index, tail)
+    return index
 
 #------------------------------------------------------------------------------
 
@@ -344,10 +1510,10 @@ class ResHeader:
 
         # 
         file.seek(file_pos, ABSOLUTE_POS)
-        self._packet0 = read_packet(file, '?')
+        self._packet0 = bytes(read_packet(file, '?'))
         
         file_pos = file.tell()
-        self._packet1 = read_packet(file, '?')
+        self._packet1 = bytes(read_packet(file, '?'))
         if len(self._packet1) == 4: 
             file.seek(file_pos, ABSOLUTE_POS)
     
@@ -359,6 +1525,27 @@ class ResHeader:
         print('  ', self.xline1)
        
 
+def read_text(file): 
+    # model and log (string packets after the signature)
+    model, log = [], []
+    section = 0
+    while True: 
+        try:
+            s = read_packet(file, 'str')
+            if s == ASTRA_RES_SIGNATURE: # separator between model section and log section
+                section += 1
+            elif section == 0: 
+                model.append(s)
+            elif section == 1: 
+                log.append(s)
+            else: 
+                continue
+            
+        except NotAString: 
+            count_probe(file, 'NotAString')
+            break
+    return model, log
+
 def get_const_names(str_list): 
     result = []
     section = 0
@@ -374,84 +1561,916 @@ def get_const_names(str_list):
     
     return result
 
+def _projected_index(index, name, kind): 
+    # index of the requested name (see ResFile._set_projection)
+    if isinstance(name, (int, np.integer)): 
+        return int(name)
+    try: 
+        return index[name]
+    except KeyError: 
+        raise AstraResError('no ' + kind + ' ' + str(name))
+
+def time_span(rad_times, time_times): 
+    # (start, end) of all the time instants or None
+    tt = np.concatenate([np.asarray(rad_times, dtype=np.float64), np.asarray(time_times, dtype=np.float64)])
+    if len(tt) == 0: 
+        return None
+    return float(tt.min()), float(tt.max())
+
+def name_map(names): 
+    # name -> index of its first occurrence (the same as list.index)
+    result = {}
+    for i, name in enumerate(names): 
+        result.setdefault(name, i)
+    return result
+
+def actualize_profile_names(names, scales, n): 
+    # correction of the rad names: n - actual number of the profiles in the frame
+    n_ = len(names)                
+    if n_ > n: 
+        print('WARNING! Actual profile number is less the expected number')
+        return names[0:n], scales[0:n]  # remove "#last" if needed
+    elif n_ < n: 
+        # Just for the case. 
+        print('WARNING! Actual profile number exceeds the expected number')
+        return (names + ['#last', '#last2', '#last3', '#last4', '#last5'][0:n-n_], 
+                scales + [1.0]*(n-n_))
+    else: 
+        return list(names), list(scales)
+
+def stack_rows(blocks, width): 
+    # 2d arrays -> one 2d array with the given number of columns (padded with NaN)
+    if all(b.shape[1] == width for b in blocks): 
+        return np.concatenate(blocks) if len(blocks) > 0 else np.zeros((0, width))
+    
+    print('WARNING! Different number of the signals in the time slices')
+    result = np.full((sum(len(b) for b in blocks), width), np.nan)
+    i = 0
+    for b in blocks: 
+        w = min(width, b.shape[1])
+        result[i:i+len(b), 0:w] = b[:, 0:w]
+        i += len(b)
+    return result
+
+def grow_rows(buf, n, rows): 
+    # writes the rows after the first n rows of the buffer. 
+    # The buffer is reallocated with double capacity if needed
+    need = n + len(rows)
+    if need > len(buf): 
+        new_buf = np.empty((max(need, 2*len(buf)), buf.shape[1]), buf.dtype)
+        new_buf[0:n] = buf[0:n]
+        buf = new_buf
+    buf[n:need] = rows
+    return buf
+
+class ProfileStore: 
+    """
+    Profiles of all the frames in the flat buffers (one buffer per profile name): 
+    profile k of the frame i is data[k, offsets[i]:offsets[i+1]]. 
+    Different frames can have different radial lengths
+    """
+    def __init__(self, nprof, dtype=np.float64): 
+        self._buf = np.zeros((nprof, 0), dtype)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def data(self): 
+        self._ensure(range(self._buf.shape[0]))
+        return self._buf[:, 0:self.offsets[-1]]
+
+    def _ensure(self, ks): 
+        # rows ks of the buffer must be ready (see QuantizedProfileStore)
+        pass
+
+    def get_frame_count(self): 
+        return len(self.lengths)
+
+    def get_profile_count(self): 
+        return self._buf.shape[0]
+
+    def get_row(self, k): 
+        # profile k of all the frames one after another (view)
+        self._ensure([k])
+        return self._buf[k, 0:self.offsets[-1]]
+
+    def get_rows(self, ks): 
+        self._ensure(ks)
+        return self._buf[ks, 0:self.offsets[-1]]
+
+    def get(self, k, i): 
+        # profile k of the frame i (view)
+        self._ensure([k])
+        return self._buf[k, self.offsets[i]:self.offsets[i+1]]
+
+    def dense(self, k): 
+        # profile k of all the frames as 2d array (n_frames x n_rho_max). 
+        # For the common case of equal lengths it is a view, otherwise a copy padded with NaN
+        self._ensure([k])
+        n = len(self.lengths)
+        L = self.lengths.max() if n > 0 else 0
+        if np.all(self.lengths == L): 
+            return self._buf[k, 0:n*L].reshape(n, L)
+        return self.take([k], np.arange(n))[0]
+
+    def take(self, ks, frames): 
+        # profiles ks of the given frames as 3d array (len(ks) x len(frames) x n_rho_max), 
+        # padded with NaN if the frames have different radial lengths 
+        ks = np.asarray(ks, dtype=np.int64)
+        frames = np.asarray(frames, dtype=np.int64)
+        self._ensure(ks)
+        n = len(self.lengths)
+        L = self.lengths.max() if n > 0 else 0
+        if np.all(self.lengths == L): 
+            cube = self._buf[:, 0:n*L].reshape(-1, n, L)
+            return cube[np.ix_(ks, frames)]
+        
+        lengths = self.lengths[frames]
+        L = lengths.max() if len(frames) > 0 else 0
+        valid = np.arange(L) < lengths[:, None]
+        cols = np.where(valid, self.offsets[frames][:, None] + np.arange(L), 0)
+        result = self._buf[ks[:, None, None], cols[None, :, :]]
+        result[:, ~valid] = np.nan
+        return result
+
+    def append(self, frames): 
+        # frames: list of the lists of 1d arrays (profiles of one frame)
+        arrays = [arr for profiles in frames for arr in profiles]
+        values = np.concatenate(arrays) if len(arrays) > 0 else np.zeros(0)
+        self.append_flat(values, [len(arr) for arr in arrays], [len(profiles) for profiles in frames])
+
+    def append_flat(self, values, sizes, counts): 
+        # values: profiles of the frames one after another (see dequantize_profiles), 
+        # sizes: lengths of the profiles, counts: numbers of the profiles in the frames. 
+        # The radial length of the frame is the length of its first profile, 
+        # the runs of the frames with the same length and all the profiles of this length 
+        # are copied by one transposition, the others frame by frame
+        sizes = np.asarray(sizes, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        first = np.concatenate([[0], np.cumsum(counts)])   # index of the first profile of the frame
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        lengths = np.where(counts > 0, sizes[np.minimum(first[0:-1], len(sizes) - 1)] if len(sizes) > 0 else 0, 0)
+        
+        nprof = max([self._buf.shape[0]] + list(counts))
+        n = self.offsets[-1]
+        need = n + lengths.sum()
+        if (need > self._buf.shape[1])or(nprof > self._buf.shape[0]): # capacity is doubled
+            buf = np.empty((nprof, max(need, 2*self._buf.shape[1])), self._buf.dtype)
+            buf[0:self._buf.shape[0], 0:n] = self._buf[:, 0:n]
+            buf[self._buf.shape[0]:, 0:n] = np.nan
+            self._buf = buf
+        
+        irregular = np.bincount(np.repeat(np.arange(len(counts)), counts)[sizes != np.repeat(lengths, counts)], 
+                                minlength=len(counts)) > 0
+        regular = (counts == nprof) & ~irregular
+        # runs of the frames: [i, j) with the same regularity and length
+        change = np.flatnonzero((regular[1:] != regular[:-1])|(lengths[1:] != lengths[:-1])) + 1
+        runs = np.concatenate([[0], change, [len(counts)]])
+        
+        pos = n
+        for i, j in zip(runs[0:-1], runs[1:]): 
+            if j <= i: 
+                continue
+            if regular[i]: 
+                L = lengths[i]
+                block = values[bounds[first[i]]:bounds[first[j]]].reshape(j - i, nprof, L)
+                self._buf[:, pos:pos + (j - i)*L] = block.transpose(1, 0, 2).reshape(nprof, -1)
+                pos += (j - i)*L
+                continue
+            for f in range(i, j): 
+                L = lengths[f]
+                self._buf[:, pos:pos+L] = np.nan
+                for k in range(min(counts[f], nprof)): 
+                    a = bounds[first[f] + k]
+                    m = min(L, sizes[first[f] + k])
+                    self._buf[k, pos:pos+m] = values[a:a+m]
+                pos += L
+        
+        self.lengths = np.concatenate([self.lengths, lengths.astype(np.int64)])
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+
+    def truncate(self, n_frames): 
+        self.lengths = self.lengths[0:n_frames]
+        self.offsets = self.offsets[0:n_frames+1]
+
+def _store_profile(store, i, profiles, k): 
+    # profile k of the frame i with the array from the store (see ResFile._append_profiles)
+    p = profiles[k]
+    if (p is not SKIPPED_PROFILE)and(k < store.get_profile_count()): 
+        p._array = store.get(k, i)
+    return p
+
+class QuantizedProfileStore(ProfileStore): 
+    """
+    ProfileStore kept as the int16 codes of ASTRA with the coefficients (see _convert): 
+    codes (nprof x n_values) in the layout of ProfileStore, 
+    scale, down, code_lengths (nprof x n_frames) - coefficients and lengths of the profiles 
+    (the values after code_lengths are NaN). 
+    Float values of the profile are calculated at the first access, for all the frames at once
+    """
+    def __init__(self, codes, scale, down, code_lengths, lengths, dtype=np.float64): 
+        self.codes, self.scale, self.down = codes, scale, down
+        self.code_lengths = np.asarray(code_lengths, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64)
+        self._buf = np.empty(codes.shape, dtype)  # pages are not touched until the rows are decoded
+        self._ready = np.zeros(codes.shape[0], dtype=bool)
+
+    def _ensure(self, ks): 
+        for k in ks: 
+            if not self._ready[k]: 
+                self._decode_row(k)
+
+    def _decode_row(self, k): 
+        n = self.offsets[-1]
+        down = np.repeat(self.down[k], self.lengths)
+        scale = np.repeat(self.scale[k], self.lengths)
+        self._buf[k, 0:n] = _convert(np.asarray(self.codes[k, 0:n]), down, scale)
+        if np.any(self.code_lengths[k] != self.lengths): 
+            pos = np.arange(n) - np.repeat(self.offsets[0:-1], self.lengths)
+            self._buf[k, 0:n][pos >= np.repeat(self.code_lengths[k], self.lengths)] = np.nan
+        self._ready[k] = True
+
+    def append(self, frames): 
+        raise AstraResError('QuantizedProfileStore can not be extended')
+
+def quantize_store(frames, nprof): 
+    # int16 codes of the profiles of the frames in the layout of ProfileStore: 
+    # returns codes, scale, down, code_lengths, lengths (see QuantizedProfileStore)
+    n = len(frames)
+    nprof = max([nprof] + [len(fr.profiles) for fr in frames])
+    lengths = np.array([len(fr.profiles[0].raw_array) if len(fr.profiles) > 0 else 0 
+                        for fr in frames], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    codes = np.zeros((nprof, offsets[-1]), np.int16)
+    scale, down = np.full((nprof, n), np.nan), np.full((nprof, n), np.nan)
+    code_lengths = np.zeros((nprof, n), dtype=np.int64)
+    for i, fr in enumerate(frames): 
+        for k, p in enumerate(fr.profiles[0:nprof]): 
+            m = min(lengths[i], len(p.raw_array))
+            codes[k, offsets[i]:offsets[i]+m] = p.raw_array[0:m]
+            scale[k, i], down[k, i], code_lengths[k, i] = p.scale, p.down, m
+    return codes, scale, down, code_lengths, lengths
+
+def ragged_interp_weights(xq, x, lengths): 
+    """
+    Weights of np.interp(xq, x_j, y_j) for all the segments at once. 
+    Segments x_j follow one another in the flat array x, lengths - their lengths. 
+    xq is common for all the segments, x must increase inside each segment. 
+    Returns i0, i1, w (n_segments x len(xq)): y = y[i0] + w*(y[i1] - y[i0])
+    """
+    xq = np.atleast_1d(np.asarray(xq, dtype=np.float64))
+    x = np.asarray(x, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    nseg = len(lengths)
+    starts = np.concatenate([[0], np.cumsum(lengths)])[0:nseg]
+    
+    # exact integer ranks of all the values, 
+    # so all the segments can be searched by one searchsorted
+    _, ranks = np.unique(np.concatenate([x, xq]), return_inverse=True)
+    R = len(ranks) + 1
+    keys = np.repeat(np.arange(nseg, dtype=np.int64), lengths)*R + ranks[0:len(x)]
+    qkeys = np.arange(nseg, dtype=np.int64)[:, None]*R + ranks[len(x):][None, :]
+    count = np.searchsorted(keys, qkeys, 'right') - starts[:, None] # number of x_j <= xq
+    del qkeys
+    
+    L = lengths[:, None]
+    last = np.maximum(starts[:, None] + L - 1, 0)
+    i0 = np.minimum(starts[:, None] + np.clip(count - 1, 0, np.maximum(L - 2, 0)), last)
+    i1 = np.minimum(i0 + 1, last)
+    if len(x) == 0: 
+        return i0, i1, np.full(i0.shape, np.nan)
+    
+    x0, x1 = x[i0], x[i1]
+    with np.errstate(invalid='ignore', divide='ignore'): 
+        w = np.where(x1 > x0, (xq[None, :] - x0)/(x1 - x0), 0.0)
+    w = np.clip(w, 0.0, 1.0)
+    w[lengths == 0] = np.nan
+    return i0, i1, w
+
+def apply_interp_weights(y, i0, i1, w): 
+    y0, y1 = y[i0], y[i1]
+    result = y1 - y0
+    result *= w
+    result += y0
+    np.copyto(result, y1, where=(w >= 1.0))
+    return result
+
+def ragged_interp(xq, x, y, lengths): 
+    """
+    np.interp(xq, x_j, y_j) for all the segments at once (see ragged_interp_weights). 
+    Returns 2d array (n_segments x len(xq)), NaN for the empty segments
+    """
+    i0, i1, w = ragged_interp_weights(xq, x, lengths)
+    if len(y) == 0: 
+        return w
+    return apply_interp_weights(np.asarray(y), i0, i1, w)
+
+#%%  Sidecar index file 
+
+RESIDX_EXT = '.residx'
+RESIDX_VERSION = 1
+
+def index_cache_path(filename): 
+    return os.fspath(filename) + RESIDX_EXT
+
+def _file_key(filename): 
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+def _header_to_dict(header): 
+    # returns (json-compatible dict, dict of arrays)
+    meta, infos, raw, arrays = {}, {}, [], {}
+    for key, value in vars(header).items(): 
+        if isinstance(value, ResOutputInfo): 
+            infos[key] = {'names': value.names, 'scales': [float(x) for x in value.scales]}
+        elif isinstance(value, np.ndarray): 
+            arrays[key] = value
+        elif isinstance(value, (bytes, memoryview)): 
+            arrays[key] = np.frombuffer(value, np.uint8)
+            raw.append(key)
+        else: 
+            meta[key] = value
+    return {'attrs': meta, 'infos': infos, 'raw': raw}, arrays
+
+def _header_from_dict(d, arrays): 
+    header = ResHeader.__new__(ResHeader)
+    for key, value in d['attrs'].items(): 
+        setattr(header, key, value)
+    for key, value in d['infos'].items(): 
+        info = ResOutputInfo.__new__(ResOutputInfo)
+        info.names, info.scales = value['names'], value['scales']
+        setattr(header, key, info)
+    for key, value in arrays.items(): 
+        setattr(header, key, value.tobytes() if key in d['raw'] else value)
+    return header
+
+def save_index_cache(res): 
+    size, mtime = _file_key(res.filename)
+    index = res._frame_index
+    header, header_arrays = _header_to_dict(res.header)
+    meta = {
+        'version': RESIDX_VERSION, 'filesize': size, 'mtime_ns': mtime, 
+        'last_file_pos': res._last_file_pos, 
+        'model': res.model, 'log': res.log, 'const_names': res.const_names, 
+        'header': header
+    }
+    arrays = {
+        'meta': np.array(json.dumps(meta)), 
+        'frame_pos': np.array([fi.pos for fi in index], dtype=np.int64), 
+        'frame_end': np.array([fi.end for fi in index], dtype=np.int64), 
+        'nslices': np.array([fi.nslices for fi in index], dtype=np.int64), 
+        'rad_times': np.array([fi.prof_time_stamp for fi in index], dtype=np.float64), 
+        'time_times': np.concatenate([np.zeros(0)] + [fi.slice_times for fi in index]), 
+        'profile_count': np.array([len(fi.profile_pos) for fi in index], dtype=np.int64), 
+        'profile_pos': np.concatenate([np.zeros(0, dtype=np.int64)] + [fi.profile_pos for fi in index]), 
+    }
+    if res._compressed is not None: # starts of the members for the random access (see CompressedFile)
+        arrays['seek_points'] = np.array(res._compressed.seek_points, dtype=np.int64).reshape(-1, 2)
+    for key, value in header_arrays.items(): 
+        arrays['header.' + key] = value
+    
+    path = index_cache_path(res.filename)
+    try: 
+        with open(path + '.tmp', 'wb') as f: 
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+    except OSError as e: 
+        print('WARNING! Index cache is not saved: ', e)
+
+def load_index_cache(res): 
+    # returns False if there is no valid index file
+    path = index_cache_path(res.filename)
+    if not os.path.exists(path): 
+        return False
+    
+    try: 
+        with np.load(path, allow_pickle=False) as data: 
+            arrays = {key: data[key] for key in data.files}
+        meta = json.loads(str(arrays['meta']))
+    except Exception: 
+        return False
+    
+    if (meta['version'], meta['filesize'], meta['mtime_ns']) != (RESIDX_VERSION,) + _file_key(res.filename): 
+        return False
+    
+    res.model, res.log, res.const_names = meta['model'], meta['log'], meta['const_names']
+    header_arrays = {key[7:]: value for key, value in arrays.items() if key.startswith('header.')}
+    res.header = _header_from_dict(meta['header'], header_arrays)
+    res._last_file_pos = meta['last_file_pos']
+    if ('seek_points' in arrays)and(res._compressed is not None): 
+        res._compressed.add_seek_points(arrays['seek_points'].tolist())
+    
+    nslices, profile_count = arrays['nslices'], arrays['profile_count']
+    slice_bounds = np.concatenate([[0], np.cumsum(nslices)])
+    profile_bounds = np.concatenate([[0], np.cumsum(profile_count)])
+    res._frame_index = []
+    for i in range(len(nslices)): 
+        fi = ResFrameIndex.__new__(ResFrameIndex)
+        fi.pos, fi.end = int(arrays['frame_pos'][i]), int(arrays['frame_end'][i])
+        fi.nslices = int(nslices[i])
+        fi.prof_time_stamp = float(arrays['rad_times'][i])
+        fi.slice_times = arrays['time_times'][slice_bounds[i]:slice_bounds[i+1]]
+        fi.profile_pos = arrays['profile_pos'][profile_bounds[i]:profile_bounds[i+1]]
+        res._frame_index.append(fi)
+    return True
+
 #%%  Res file main object
 
 class ResFile: 
-    def __init__(self, filename): 
-        self.filename = filename
-        self.filesize = os.path.getsize(filename)
+    def __init__(self, filename, use_mmap=False, lazy=False, index_cache=False, columnar=False, 
+                 dequantize='eager', dtype=np.float64, cache_values=True, frames=True, 
+                 stats=False, hook=None, time_range=None, profiles=None, signals=None): 
+        # lazy: the first pass records only the positions of the frames and profiles, 
+        #       they are decoded at the first access (the file stays mapped)
+        # index_cache: the positions of the frames are stored in the sidecar file (*.residx) 
+        #       and reused while size and mtime of the res-file are not changed 
+        # columnar: profiles are moved to ProfileStore (see profile_store())
+        # dequantize: 'eager' or 'lazy' - only int16 codes of the profiles are kept, 
+        #       float values (of the given dtype) are calculated at the access 
+        #       and kept if cache_values (see ProfileDecoding)
+        # frames: False - only text and header are read (for cataloguing), 
+        #       time_range is taken from the first and the last frames
+        # stats, hook: instrumentation of the reading (see ParseStats), self.stats is None if disabled
+        # time_range: (t0, t1) - only the frames with t0 <= prof_time_stamp <= t1 are read, 
+        #       the first one is found by the binary search (or by the sidecar index if it exists)
+        # profiles, signals: names (or indices) of the profiles and signals to be read (None - all). 
+        #       Packets of the other profiles are skipped, their positions are kept (see Projection), 
+        #       the signals matrix has only '#time' and the requested columns
+        # gzip, xz and zstd-compressed files are decompressed on the fly (see CompressedFile), 
+        #       use_mmap is ignored for them. Lazy frames and time_range decompress from the nearest 
+        #       member start, that are kept in the sidecar index (only the files of compress_res_file 
+        #       have many members, the usual ones are decompressed from the beginning)
+        # filename: name of the local file, http(s) URL, bytes or ByteSource 
+        #       (URL is read by the range requests through BlockCache)
+        if dequantize not in ('eager', 'lazy'): 
+            raise AstraResError('Unknown dequantize mode ' + str(dequantize))
+        
+        self.source = byte_source(filename)  # None for the local file
+        if self.source is None: 
+            filename = os.fspath(filename)   # pathlib.Path
+        if (self.source is not None)and(index_cache): 
+            raise AstraResError('index_cache requires the local res-file')
+        self.filename = filename if self.source is None else self.source.name
+        self.filesize = os.path.getsize(filename) if self.source is None else self.source.size
+        self.lazy = lazy
+        self.decoding = ProfileDecoding(dequantize == 'lazy', dtype, cache_values, packed=dequantize == 'lazy')
+        self.stats = ParseStats(hook) if (stats or hook is not None) else None
+        self.time_window = None if time_range is None else (float(time_range[0]), float(time_range[1]))
         
         self.log = []
         self.model = []
         self.frames = [] 
-        with open(filename, "rb") as file: 
+        self._frame_index = None
+        self._header_rad_names = None
+        self._profiles = None
+        self._regrid_cache = {}
+        self._const_values = None
+        self._projection_request = (profiles, signals)
+        self.projection = ALL_DATA
+        self.compression = detect_compression(self.source or filename) if self.filesize > 0 else None
+        with open_res_file(self.source or filename, self.compression) as file: 
+            self._compressed = file if self.compression is not None else None
+            file = self._counting(file)
+            if not frames: 
+                self._read_header_only(file)
+                self._compressed = None
+                self._finish_stats()
+                return
+            buf = self._buffer(file, use_mmap or lazy or index_cache or time_range is not None)
+            if buf is not None: 
+                # packets are decoded directly from the mapped memory. 
+                # Arrays of the profiles refer to the mapping, 
+                # so it is kept open as long as the ResFile (or its arrays) lives
+                self._mmap = buf
+                self._read(self._mem_reader(self._mmap), index_cache)
+            else: 
+                self._mmap = None
+                self._read(file, index_cache)
+        self._compressed = None
+        
+        if columnar: 
+            with self._phase('columnar'): 
+                self.profile_store()
+        self._finish_stats()
+
+    def _buffer(self, file, mapped): 
+        # whole content for MemReader (mapped local file or the source in memory), 
+        # None if the input is read as the file
+        if (self.compression is not None)or(self.filesize == 0): 
+            return None
+        if self.source is not None: 
+            return self.source.buffer()
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if mapped else None
+
+    def _lazy_frame(self, i): 
+        if self._reader is None: 
+            raise AstraResError('ResFile is closed')
+        return ResFrame(self._reader, self._frame_index[i], self.decoding, self.projection)
+
+    def close(self): 
+        # releases the mapping, the reader of the lazy frames and the source. 
+        # Decoded frames stay available, the mapping is unmapped when the last array 
+        # referring to it (use_mmap) is deleted
+        if self._reader is not None: 
+            self._reader.close()
+            self._reader = None
+        if self.source is not None: 
+            self.source.close()
+        if isinstance(self._mmap, mmap.mmap): 
+            try: 
+                self._mmap.close()
+            except BufferError: # exported to the arrays of the profiles
+                pass
+        self._mmap = None
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        self.close()
+
+    def _phase(self, name, file=None): 
+        # context of the instrumented phase of the reading (see ParseStats)
+        return NO_PHASE if self.stats is None else self.stats.phase(name, file)
+
+    def _counting(self, file): 
+        return file if self.stats is None else CountingFile(file, self.stats)
+
+    def _mem_reader(self, buf): 
+        return MemReader(buf) if self.stats is None else CountingMemReader(buf, self.stats)
+
+    def _finish_stats(self): 
+        if self.stats is not None: 
+            if self._frame_index is not None: 
+                profiles = sum(len(fi.profile_pos) for fi in self._frame_index)
+            elif self._profiles is not None: 
+                profiles = self._profiles.get_profile_count()*self._profiles.get_frame_count()
+            else: 
+                profiles = sum(len(fr.profiles) for fr in self.frames)
+            self.stats.finish(self.get_frame_count(), profiles)
+
+    def _read(self, file, index_cache=False): 
+        cached = False
+        if index_cache or (self.time_window is not None): 
+            with self._phase('index_cache'): 
+                cached = load_index_cache(self)
+        if not cached: 
+            self._read_text_and_header(file)
+        self._set_projection(None if cached else file)
+        
+        if cached and (self.time_window is not None): 
+            t0, t1 = self.time_window
+            self._frame_index = [fi for fi in self._frame_index if t0 <= fi.prof_time_stamp <= t1]
+        elif not cached: 
+            if self.time_window is not None: 
+                self._read_window_frames(file)
+            else: 
+                self._read_frames(file, indexed=index_cache)
+                if index_cache: 
+                    save_index_cache(self)
+        
+        self._reader = None
+        if self._frame_index is not None: 
+            if self.lazy: 
+                self._reader = file
+                self.frames = LazyList(self._lazy_frame, len(self._frame_index))
+            else: # decode all at once
+                with self._phase('decode', file): 
+                    decoding = self._parse_decoding()
+                    self.frames = [ResFrame(file, fi, decoding, self.projection) for fi in self._frame_index]
+                    for fr in self.frames: 
+                        fr.profiles = list(fr.profiles)
+                self._frame_index = None
+        
+        if self._frame_index is None: 
+            with self._phase('dequantize'): 
+                self._dequantize(self.frames)
+        
+        with self._phase('signals'): 
+            self._read_names_and_times()
+
+    def _set_projection(self, file=None): 
+        # positions of the requested profiles and columns of the requested signals (see Projection). 
+        # The number of the unnamed profiles is taken from the first frame 
+        # (from the file at its position or from the sidecar index if file is None) 
+        profiles, signals = self._projection_request
+        mask, columns = None, None
+        if profiles is not None: 
+            if file is None: 
+                n = len(self._frame_index[0].profile_pos) if len(self._frame_index) > 0 else 0
+            else: 
+                pos = file.tell()
+                try: 
+                    n = len(ResFrameIndex(file).profile_pos)
+                except Exception: # no frames yet
+                    n = 0
+                file.seek(pos, ABSOLUTE_POS)
+            
+            info = self.header.rad_out_info
+            names, scales = (info.names, info.scales) if self._header_rad_names is None else self._header_rad_names
+            names, _ = actualize_profile_names(names, scales, max(n, len(names)))
+            index = name_map(names)
+            ks = [_projected_index(index, name, 'radial profile') for name in profiles]
+            mask = np.zeros(len(names), dtype=bool)
+            mask[[0] + ks] = True   # radius is always read
+        
+        if signals is not None: 
+            index = name_map(self.header.time_out_info.names)
+            columns = [0]
+            for name in signals: 
+                c = _projected_index(index, name, 'time signal')
+                if c not in columns: 
+                    columns.append(c)
+            columns = np.array(columns, dtype=np.int64)
+        
+        self.projection = ALL_DATA if (mask is None)and(columns is None) else Projection(mask, columns)
+
+    def _read_names_and_times(self): 
+        self._actualize_profile_name_list()
+        self.time_names = self.header.time_out_info.names
+        if self.projection.signals is not None: 
+            self.time_names = [self.time_names[c] for c in self.projection.signals]
+        self._time_index = name_map(self.time_names)
+
+        self.rad_times = self.extract_time_array('rad')
+        
+        self._signals = None
+        if self._frame_index is None: 
+            self.time_times = self.signals_matrix()[:, 0]
+        else: # signals matrix is assembled at the first request
+            self.time_times = self.extract_time_array('time')
+        self.time_range = time_span(self.rad_times, self.time_times)
+
+    def _read_header_only(self, file): 
+        # text and header, the time range from the first and the last frames. 
+        # The last frame is found from the end of the file (see find_last_frame)
+        self._read_text_and_header(file)
+        first = last = None
+        start = file.tell()
+        if (self.filesize > start)or(self.compression is not None): 
+            with self._phase('frame_ends'): 
+                buf = self._buffer(file, True)
+                if buf is not None: 
+                    reader = self._mem_reader(buf)
+                    reader.seek(start)
+                else: # compressed file or the source: the frames are scanned
+                    reader = file
+                try: 
+                    first = ResFrameIndex(reader)
+                except Exception: 
+                    pass
+                if first is not None: 
+                    if isinstance(reader, MemReader): 
+                        last = find_last_frame(reader, first.end)
+                    elif self.compression is None: 
+                        last = read_tail_frame(reader, first.end, self.filesize, first.end - first.pos)
+                    if last is None: # incomplete frame in the end: all the frames are scanned
+                        reader.seek(first.end)
+                        index, _ = read_frame_list(reader, indexed=True)
+                        last = index[-1] if len(index) > 0 else first
+                del reader
+        
+        self._last_file_pos = None
+        self._signals = None
+        if first is not None: 
+            self._actualize_profile_name_list(len(first.profile_pos))
+        else: 
+            self.rad_names = list(self.header.rad_out_info.names)
+            self._rad_index = name_map(self.rad_names)
+        self.time_names = self.header.time_out_info.names
+        self._time_index = name_map(self.time_names)
+        self.rad_times, self.time_times = np.zeros(0), np.zeros(0)
+        if first is None: 
+            self.time_range = None
+        else: 
+            self.time_range = (time_span([first.prof_time_stamp], first.slice_times)[0], 
+                               time_span([last.prof_time_stamp], last.slice_times)[1])
+
+    def _parse_decoding(self): 
+        # frames read at once are converted by _dequantize after the reading
+        if self.decoding.lazy: 
+            return self.decoding
+        return ProfileDecoding(True, self.decoding.dtype, self.decoding.cache)
+
+    def _dequantize(self, frames): 
+        # all the profiles of the frames are converted by one vectorized operation
+        if not self.decoding.lazy: 
+            profiles = [p for fr in frames for p in fr.profiles]
+            for p in profiles: 
+                p.decoding = self.decoding
+            _ = profile_arrays(profiles, self.decoding)
+
+    def _read_text_and_header(self, file): 
+        with self._phase('text', file): 
             # read signature ------------------------------
             _ = read_signature_packet(file)
             
             # read model and log --------------------------
-            section = 0
-            while True: 
-                try:
-                    s = read_packet(file, 'str')
-                    if s == ASTRA_RES_SIGNATURE: # separator between model section and log section
-                        section += 1
-                    elif section == 0: 
-                        self.model.append(s)
-                    elif section == 1: 
-                        self.log.append(s)
-                    else: 
-                        continue
-                    
-                except NotAString: 
-                    break
-                
+            self.model, self.log = read_text(file)
             self.const_names = get_const_names(self.log)
-               
+           
+        with self._phase('header', file): 
             # read header  (2 packets) --------------------
             self.header = ResHeader(file)
 
-            # read frames  --------------------------------
-            while True: 
+    def _read_frames(self, file, indexed=False): 
+        # indexed: only the positions are recorded (see ResFrameIndex)
+        indexed = indexed or self.lazy
+        with self._phase('frames', file): 
+            # the packed profiles refer to the blocks of the file (see PackedProfiles)
+            streamed = (self.compression is not None)or(
+                       ((self.source is not None)or(self.decoding.packed))and(not isinstance(file, MemReader)))
+            read = read_frame_blocks if streamed else read_frame_list
+            frames, error = read(file, indexed, self._parse_decoding(), self.projection)
+        if indexed: 
+            self._frame_index = frames
+        else: 
+            self.frames = frames
+        
+        if error is not None: 
+            print(type(error).__name__, ": '", error, "'")
+            print('WARNING! Not all the frames have been readed!')
+        
+        self._last_file_pos = file.tell()
+        end = self.filesize if self.compression is None else file.seek(0, 2)
+        if self._last_file_pos != end: 
+            print('WARNING! End of the file not reached!')
+
+    def _read_window_frames(self, reader): 
+        # positions of the frames in the time window (see ResFrameIndex)
+        t0, t1 = self.time_window
+        index = []
+        with self._phase('frames', reader): 
+            pos = reader.tell()
+            if isinstance(reader, MemReader): 
+                pos = find_window_start(reader, pos, t0)
+            elif self.compression is None: # byte source: the binary search by the probes
                 try: 
-                    # frame = ResFrame(file, len(self.rad_names)) # ??? I don't know the exact number of the unnamed profiles 
-                    frame = ResFrame(file) 
-                    self.frames.append(frame)
-                except EndOfFile:
-                    break   #OK                    
-                except BaseException as e: 
-                    print(type(e).__name__, ": '", e, "'")
-                    print('WARNING! Not all the frames have been readed!')
-                    break
-            
-            self._last_file_pos = file.tell()
-            if self._last_file_pos != self.filesize: 
-                print('WARNING! End of the file not reached!')
-                
+                    first = ResFrameIndex(reader)
+                    pos = find_window_probe(reader, pos, self.filesize, t0, 3*(first.end - pos) + 12)
+                except Exception: 
+                    pass
+            # compressed file: the frames before the window are scanned
+            if pos is not None: 
+                reader.seek(pos)
+                while True: 
+                    try: 
+                        fi = ResFrameIndex(reader)
+                    except Exception: # end of the file or incomplete frame
+                        break
+                    if fi.prof_time_stamp > t1: 
+                        break
+                    if fi.prof_time_stamp >= t0: 
+                        index.append(fi)
+        self._frame_index = index
+        self._last_file_pos = index[-1].end if len(index) > 0 else reader.tell()
+
+    def refresh(self): 
+        """
+        Reads the frames appended to the res-file since the last reading 
+        (for the res-file that is still being written by ASTRA). 
+        Only the new bytes and the last already read frame (that could be incomplete) are read. 
+        Incomplete frame in the end of the file is left for the next refresh. 
+        Returns the number of new frames
+        """
+        if self._last_file_pos is None: 
+            raise AstraResError('ResFile is detached from the file, it can not be refreshed')
+        if self.time_window is not None: 
+            raise AstraResError('ResFile restricted by the time range can not be refreshed')
+        if self.compression is not None: 
+            raise AstraResError('Compressed res-file can not be refreshed')
+        if self.source is not None: 
+            raise AstraResError('ResFile read from the byte source can not be refreshed')
+        filesize = os.path.getsize(self.filename)
+        if filesize == self._last_file_pos: 
+            return 0
+        
+        t = time.perf_counter()
+        # the last frame is read again
+        n_old = self.get_frame_count()
+        start = self._frame_pos(n_old - 1) if n_old > 0 else self._last_file_pos
+
+        with open(self.filename, "rb") as file: 
+            if not self._appended_only(file, filesize, start, n_old): 
+                # the frames read before are not valid any more, 
+                # the mapping of the lazy frames is released, they raise AstraResError instead of SIGBUS
+                if self._reader is not None: 
+                    self.close()
+                raise AstraResError('The res-file is truncated or rewritten, it can not be refreshed: ' + self.filename)
+            if n_old > 0: 
+                self._remove_last_frame()
             
-            # ---------------------------------------------
+            if (n_old == 0)and(self._projection_request[0] is not None): 
+                # the positions of the profiles are known only from the first frame
+                file.seek(start, ABSOLUTE_POS)
+                self._set_projection(file)
+            if self._frame_index is not None: 
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._reader = self._mem_reader(self._mmap)
+                self._reader.seek(start)
+                index, _ = read_frame_list(self._reader, indexed=True)
+                self._last_file_pos = self._reader.tell()
+                self._frame_index.extend(index)
+                self.frames.resize(len(self._frame_index))
+                new_frames = index
+            else: 
+                file.seek(start, ABSOLUTE_POS)
+                reader = self._mem_reader(file.read(filesize - start))
+                new_frames, _ = read_frame_list(reader, decoding=self._parse_decoding(), 
+                                                projection=self.projection)
+                self._last_file_pos = start + reader.tell()
+                for fr in new_frames: 
+                    fr.pos += start
+                self._dequantize(new_frames)
+                self.frames.extend(new_frames)
+        
+        self.filesize = filesize
+        self._const_values = None
+        
+        # ---------------------------------------------
+        if n_old <= 1: 
             self._actualize_profile_name_list()
-
-            self.rad_times = self.extract_time_array('rad')
-            self.time_times = self.extract_time_array('time')
-
-            self.rad_names = self.header.rad_out_info.names
-            self.time_names = self.header.time_out_info.names
+        
+        tt = self.rad_times
+        self.rad_times = np.concatenate([tt, [fr.prof_time_stamp for fr in new_frames]])
+        
+        if self._signals is not None: 
+            self._append_signal_rows(self._signal_blocks(new_frames))
+        if self._profiles is not None: 
+            self._append_profiles(n_old - 1 if n_old > 0 else 0)
+        
+        if self._frame_index is None: 
+            self.time_times = self._signals[:, 0]
+        else: 
+            self.time_times = np.concatenate([self.time_times] + [fi.slice_times for fi in new_frames])
+        self.time_range = time_span(self.rad_times, self.time_times)
+        
+        if self.stats is not None: 
+            self.stats.add_phase('refresh', time.perf_counter() - t, filesize - start)
+            self._finish_stats()
+        return self.get_frame_count() - n_old
+
+    def _frame_pos(self, i): 
+        if self._frame_index is not None: 
+            return self._frame_index[i].pos
+        return self.frames[i].pos
+
+    def _appended_only(self, file, filesize, start, n_old): 
+        # the file is only appended since the last reading: it is not shorter 
+        # and the last read frame (with the same time) is at its position
+        if filesize < self._last_file_pos: 
+            return False
+        try: 
+            file.seek(start, ABSOLUTE_POS)
+            if (n_old == 0)and(filesize - start < 4): # the first frame is not written yet
+                return True
+            if read_packet_size(file) != 4: # the frame starts with the number of slices
+                return False
+            if n_old == 0: 
+                return True
+            file.seek(start, ABSOLUTE_POS)
+            nslices = read_packet(file, 'long')
+            if nslices > 0: 
+                skip_packet(file)
+            return read_packet(file, 'double') == self.rad_times[-1]
+        except (EndOfFile, AstraResError, struct.error): 
+            return False
+
+    def _remove_last_frame(self): 
+        if self._frame_index is not None: 
+            nslices = self._frame_index[-1].nslices
+            del self._frame_index[-1]
+            self.frames.resize(len(self._frame_index))
+        else: 
+            nslices = len(self.frames[-1].time_slices)
+            del self.frames[-1]
+        self.rad_times = self.rad_times[:-1]
+        self.time_times = self.time_times[:len(self.time_times) - nslices]
+        if self._signals is not None: 
+            self._signals = self._signals[:len(self._signals) - nslices]
+        if self._profiles is not None: 
+            self._profiles.truncate(len(self.rad_times))
    
-    def _actualize_profile_name_list(self): 
+    def _actualize_profile_name_list(self, n=None): 
         # correction of the rad names -----------------
-        n = self.get_profile_count()
-        n_ = len(self.header.rad_out_info.names)                
-        if n_ > n: 
-            print('WARNING! Actual profile number is less the expected number')
-            self.header.rad_out_info.names = self.header.rad_out_info.names[0:n]  # remove "#last" if needed
-            self.header.rad_out_info.scales = self.header.rad_out_info.scales[0:n]
-        elif n_ < n: 
-            # Just for the case. 
-            print('WARNING! Actual profile number exceeds the expected number')
-            self.header.rad_out_info.names.extend(['#last', '#last2', '#last3', '#last4', '#last5'][0:n-n_])
-            self.header.rad_out_info.scales.extend( [1.0]*(n-n_) )
+        info = self.header.rad_out_info
+        if self._header_rad_names is None: # names as they are in the header
+            self._header_rad_names = list(info.names), list(info.scales)
+        names, scales = self._header_rad_names
+        
+        n = self.get_profile_count() if n is None else n
+        info.names, info.scales = actualize_profile_names(names, scales, n)
+        self.rad_names = info.names
+        self._rad_index = name_map(self.rad_names)
 
     def extract_time_array(self, kind): 
+        if self._frame_index is not None: # frames are not decoded yet
+            if kind == 'time': 
+                return np.concatenate([np.zeros(0)] + [fi.slice_times for fi in self._frame_index])
+            elif kind == 'rad': 
+                return np.array([fi.prof_time_stamp for fi in self._frame_index])
+
         tt = []
         if kind == 'time': 
             for fr in self.frames: 
@@ -466,19 +2485,39 @@ class ResFile:
         return len(self.frames)  # len(self.rad_times)
 
     def get_signal_count(self): 
-        return len(self.header.time_names)
+        return len(self.time_names)
         
     def get_profile_count(self): 
         # return len(self.header.rad_names)
+        if self._last_file_pos is None: # detached (see res_from_arrays) or header only
+            return self._profiles.get_profile_count() if self._profiles is not None else len(self.rad_names)
         if len(self.frames) == 0: 
             return 0
         else:
             return len(self.frames[0].profiles)
 
+    def profile_index(self, name): 
+        if isinstance(name, (int, np.integer)): 
+            k = int(name)
+        else: 
+            try: 
+                k = self._rad_index[name]
+            except KeyError: 
+                raise AstraResError('no radial profile ' + str(name))
+        if not self.projection.keeps_profile(k): 
+            raise AstraResError('radial profile ' + str(name) + ' is not read (see profiles of ResFile)')
+        return k
+
+    def signal_index(self, name): 
+        if isinstance(name, (int, np.integer)): 
+            return int(name)
+        try: 
+            return self._time_index[name]
+        except KeyError: 
+            raise AstraResError('no time signal ' + str(name))
+
     def find_profile(self, name, index=None, time=None):   
-        name_idx = name if isinstance(name, int) else self.rad_names.index(name)
-        if name_idx == -1: 
-            raise AstraResError('no radial rpofile ' + str(name) )
+        name_idx = self.profile_index(name)
         
         if index is None: 
             index = np.searchsorted(self.rad_times, time)
@@ -489,19 +2528,1141 @@ class ResFile:
             raise ProfileOutOfIndex
         
         t = self.rad_times[index]
-        rr = self.frames[index].profiles[0].array
-        yy = self.frames[index].profiles[name_idx].array
+        if self._profiles is not None: 
+            rr = self._profiles.get(0, index)
+            yy = self._profiles.get(name_idx, index)
+        else: 
+            rr = self.frames[index].profiles[0].array
+            yy = self.frames[index].profiles[name_idx].array
         return rr, t, yy
 
+    def profile_store(self): 
+        """
+        Profiles of all the frames in the flat buffers (see ProfileStore). 
+        It is created at the first call, after that find_profile returns the slices of the store
+        """
+        if self._profiles is None: 
+            self._profiles = ProfileStore(len(self.rad_names), self.decoding.dtype)
+            self._append_profiles(0)
+        return self._profiles
+
+    def _indexed_profiles(self, first): 
+        # lazy file: values of the profiles of the frames first... straight from the packets 
+        # (see dequantize_packets), the frames are not decoded. Returns values, sizes, counts
+        if self._reader is None: 
+            raise AstraResError('ResFile is closed')
+        index = self._frame_index[first:]
+        counts = np.array([len(fi.profile_pos) for fi in index], dtype=np.int64)
+        pos = np.concatenate([np.zeros(0, dtype=np.int64)] + [fi.profile_pos for fi in index]).astype(np.int64)
+        keep = np.ones(len(pos), dtype=bool)
+        if self.projection.profiles is not None: # unrequested profiles are empty (see SKIPPED_PROFILE)
+            mask = np.asarray(self.projection.profiles, dtype=bool)
+            k = np.arange(len(pos)) - np.repeat(np.cumsum(counts) - counts, counts)
+            keep = k < len(mask)
+            keep[keep] = mask[k[keep]]
+        kept, dtype = pos[keep], self.decoding.dtype
+        
+        if isinstance(self._reader, MemReader): 
+            values, bounds = dequantize_packets(self._reader.buf, kept, dtype)
+            lengths = np.diff(bounds)
+        else: # the file is read by blocks of the frames
+            ends = np.repeat([fi.end for fi in index], counts)[keep]
+            parts, lengths = [np.zeros(0, dtype)], [np.zeros(0, dtype=np.int64)]
+            i = 0
+            while i < len(kept): 
+                j = max(i + 1, np.searchsorted(ends, kept[i] + _STREAM_BLOCK, 'right'))
+                self._reader.seek(kept[i], ABSOLUTE_POS)
+                values, bounds = dequantize_packets(bytes(self._reader.read(ends[j-1] - kept[i])), 
+                                                    kept[i:j] - kept[i], dtype)
+                parts.append(values)
+                lengths.append(np.diff(bounds))
+                i = j
+            values, lengths = np.concatenate(parts), np.concatenate(lengths)
+        sizes = np.zeros(len(pos), dtype=np.int64)
+        sizes[keep] = lengths
+        return values, sizes, counts
+
+    def _append_profiles(self, first): 
+        self._regrid_cache = {}
+        if self._frame_index is not None: 
+            self._profiles.append_flat(*self._indexed_profiles(first))
+            return
+        frames = [self.frames[i] for i in range(first, self.get_frame_count())]
+        profiles = [p for fr in frames for p in fr.profiles]
+        counts = [len(fr.profiles) for fr in frames]
+        if all((p._array is None)or(p is SKIPPED_PROFILE) for p in profiles): # the codes are converted at once
+            values, bounds = dequantize_profiles(profiles, self.decoding.dtype)
+            sizes = np.diff(bounds)
+        else: 
+            arrays = profile_arrays(profiles, self.decoding)
+            values = np.concatenate(arrays) if len(arrays) > 0 else np.zeros(0)
+            sizes = [len(a) for a in arrays]
+        self._profiles.append_flat(values, sizes, counts)
+        
+        # the arrays of the profiles are replaced by the views of the store at the access, 
+        # the own arrays are dropped
+        for p in profiles: 
+            if p is not SKIPPED_PROFILE: 
+                p._array = None
+        store = self._profiles
+        for i, fr in enumerate(frames, first): 
+            fr.profiles = LazyList(functools.partial(_store_profile, store, i, list(fr.profiles)), 
+                                   len(fr.profiles))
+
+    def profile_matrix(self, name): 
+        # profile of all the frames as 2d array (n_frames x n_rho_max), padded with NaN if needed
+        return self.profile_store().dense(self.profile_index(name))
+
+    def find_profiles(self, names, index=None, time=None): 
+        """
+        Several profiles by one call. 
+        index (or time) is a number or an array of the frame indices (times). 
+        Returns rr, t, yy 
+            one frame:      rr (n_rho), t, yy (n_names x n_rho)
+            array of them:  rr (n x n_rho_max), t (n), yy (n_names x n x n_rho_max)
+                            padded with NaN if the frames have different radial lengths 
+        """
+        ks = [self.profile_index(name) for name in names]
+        if index is None: 
+            index = np.minimum(np.searchsorted(self.rad_times, time), len(self.rad_times) - 1)
+        if np.any(np.asarray(index) >= self.get_frame_count()): 
+            raise ProfileOutOfIndex
+        
+        if np.ndim(index) == 0: 
+            if self._profiles is not None: 
+                rows = [self._profiles.get(k, index) for k in [0] + ks]
+            else: # only one frame is decoded
+                profiles = self.frames[index].profiles
+                rows = [profiles[k].array for k in [0] + ks]
+            return rows[0], self.rad_times[index], np.array(rows[1:]).reshape(len(ks), len(rows[0]))
+        
+        if self._profiles is not None: 
+            cube = self._profiles.take([0] + ks, index)
+        else: # only the requested frames are decoded (gathered in the small store)
+            frames = [self.frames[i].profiles for i in np.asarray(index)]
+            arrays = iter(profile_arrays([profiles[k] for profiles in frames for k in [0] + ks], self.decoding))
+            store = ProfileStore(1 + len(ks), self.decoding.dtype)
+            store.append([[next(arrays) for _ in range(1 + len(ks))] for _ in frames])
+            cube = store.take(np.arange(1 + len(ks)), np.arange(len(frames)))
+        return cube[0], self.rad_times[index], cube[1:]
+
+    def interp_profile(self, name, times, method='nearest', rho=None): 
+        """
+        Profile at many time instants by one call. 
+        method: 'nearest' - profile of the nearest frame 
+                'linear'  - linear interpolation between the neighbouring frames
+        If the frames have different radial meshes, the profiles are interpolated 
+        to the common grid rho (by default see default_rho()). 
+        Returns rho, yy (len(times) x len(rho))
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        n = self.get_frame_count()
+        if n == 0: 
+            raise ProfileOutOfIndex
+        
+        tt = self.rad_times
+        i1 = np.clip(np.searchsorted(tt, times), 1, max(n - 1, 1)) if n > 1 else np.zeros(len(times), dtype=np.int64)
+        i0 = np.maximum(i1 - 1, 0)
+        dt = tt[i1] - tt[i0]
+        with np.errstate(invalid='ignore', divide='ignore'): 
+            w = np.clip(np.where(dt > 0, (times - tt[i0])/dt, 0.0), 0.0, 1.0)
+        
+        if method == 'nearest': 
+            i0 = np.where(w > 0.5, i1, i0)
+            w = np.zeros(len(times))
+        elif method != 'linear': 
+            raise AstraResError('Unknown interpolation method ' + str(method))
+        
+        rho, yy = self.regrid(name, rho)
+        y0, y1 = yy[i0], yy[i1]
+        result = np.where(w[:, None] > 0.0, y0 + w[:, None]*(y1 - y0), y0)
+        return rho, result
+
+    def default_rho(self): 
+        # mesh of the frames if it is the same for all of them, 
+        # otherwise the uniform grid over all the meshes with the maximal number of points
+        if 'rho' not in self._regrid_cache: 
+            store = self.profile_store()
+            rr = store.dense(0)
+            if (len(rr) > 0)and np.all(store.lengths == store.lengths[0])and np.all(rr == rr[0]): 
+                rho = rr[0].copy()
+            else: 
+                lo = np.nanmin(store.data[0]) if store.data.shape[1] > 0 else 0.0
+                hi = np.nanmax(store.data[0]) if store.data.shape[1] > 0 else 1.0
+                rho = np.linspace(lo, hi, max(store.lengths.max(initial=0), 2))
+            rho.setflags(write=False)
+            self._regrid_cache['rho'] = rho
+        return self._regrid_cache['rho']
+
+    def regrid(self, names=None, rho=None): 
+        """
+        Profiles of all the frames resampled to the common radial grid rho 
+        (by default see default_rho()). 
+        names: name of the profile (returns rho, yy: n_frames x len(rho)) 
+               or list of names, None - all the profiles (returns rho, yy: n_names x n_frames x len(rho))
+        The results are cached per (name, grid) and are read-only
+        """
+        if rho is None: 
+            rho = self.default_rho()
+        rho = np.asarray(rho, dtype=np.float64)
+        key = rho.tobytes()
+        
+        single = isinstance(names, (str, int, np.integer))
+        if names is None: 
+            names = self.rad_names
+        idx = [self.profile_index(name) for name in ([names] if single else names)]
+        
+        todo = sorted(set(k for k in idx if (k, key) not in self._regrid_cache))
+        if len(todo) > 0: 
+            for k, yy in zip(todo, self._profiles_on_grid(todo, rho)): 
+                yy.setflags(write=False)
+                self._regrid_cache[(k, key)] = yy
+        
+        if single: 
+            return rho, self._regrid_cache[(idx[0], key)]
+        return rho, np.array([self._regrid_cache[(k, key)] for k in idx])
+
+    def _profiles_on_grid(self, ks, rho): 
+        # profiles ks of all the frames on the grid rho, the weights of the interpolation 
+        # are calculated once for all the profiles: returns yy (len(ks) x n_frames x len(rho))
+        store = self.profile_store()
+        n = store.get_frame_count()
+        key = ('weights', rho.tobytes())
+        if key not in self._regrid_cache: 
+            self._regrid_cache[key] = None if self._same_mesh(rho) else ragged_interp_weights(rho, store.get_row(0), store.lengths)
+        weights = self._regrid_cache[key]
+        
+        if weights is None: 
+            return store.get_rows(ks).reshape(len(ks), n, len(rho))
+        yy = np.empty((len(ks), n, len(rho)))
+        step = max(1, _CACHE_BLOCK // max(len(rho), 1))
+        for j, k in enumerate(ks): 
+            y = store.get_row(k)
+            for i in range(0, n, step): 
+                yy[j, i:i + step] = apply_interp_weights(y, *(x[i:i + step] for x in weights))
+        return yy
+
+    def _same_mesh(self, rho): 
+        # all the frames have the radial mesh rho
+        store = self.profile_store()
+        n = store.get_frame_count()
+        return np.all(store.lengths == len(rho))and np.all(store.get_row(0).reshape(n, len(rho)) == rho)
+
     def find_signal(self, name): 
-        idx = name if isinstance(name, int) else self.time_names.index(name)
-        result = []
-        for fr in self.frames: 
-            for time_slice in fr.time_slices: 
-                result.append(time_slice[idx])
-        return self.time_times, np.array(result)
+        # returns the column of the signals matrix (view, not a copy)
+        idx = self.signal_index(name)
+        return self.time_times, self.signals_matrix()[:, idx]
+
+    def find_signals(self, names): 
+        # several signals by one call: returns tt, yy (n_names x n_slices)
+        idx = [self.signal_index(name) for name in names]
+        return self.time_times, self.signals_matrix().T[idx]
+
+    def const_matrix(self): 
+        # const values of all the frames (n_frames x n_const), padded with NaN
+        if self._const_values is None: 
+            values = [np.asarray(fr.const_values, dtype=np.float64) for fr in self.frames]
+            width = max([len(v) for v in values], default=0)
+            self._const_values = np.full((len(values), width), np.nan)
+            for i, v in enumerate(values): 
+                self._const_values[i, 0:len(v)] = v
+        return self._const_values
+
+    def export(self, path, format='npz', compress=False, quantized=False): 
+        """
+        Writes the columnar content (signals matrix, profile store, times, const values, 
+        names and header) to npz or hdf5 file (see load_export). 
+        compress: compressed npz members / gzip-compressed hdf5 datasets 
+        quantized: lossless archive - profiles are kept as int16 codes of ASTRA 
+                   with scale/down coefficients (see QuantizedProfileStore)
+        """
+        export_res(self, path, format, compress, quantized)
+
+    def signals_matrix(self): 
+        """
+        Time slices of all the frames as one 2d array (n_slices x n_signals). 
+        Columns correspond to time_names, the first column is time
+        """
+        if self._signals is None: 
+            self._signals_buf = np.zeros((0, len(self.time_names)))
+            self._signals = self._signals_buf
+            frames = self.frames if self._frame_index is None else self._frame_index
+            self._append_signal_rows(self._signal_blocks(frames))
+        return self._signals
+
+    def _signal_blocks(self, frames): 
+        # time slices of the frames (or ResFrameIndex): list of 2d arrays (nslices x nsignals) 
+        blocks = []
+        for fr in frames: 
+            if isinstance(fr, ResFrame): 
+                if len(fr.time_slices) > 0: 
+                    blocks.append(np.array(fr.time_slices))
+            elif fr.nslices > 0: 
+                self._reader.seek(fr.pos + 3*4, ABSOLUTE_POS)  # after the packet with nslices
+                merged_slices = read_packet(self._reader, 'double[]')
+                blocks.append(self.projection.slice_signals(merged_slices, fr.nslices))
+        return blocks
+
+    def _append_signal_rows(self, blocks): 
+        # the rows are stored in the buffer with spare capacity, 
+        # so refresh() does not copy the whole matrix
+        n = len(self._signals)
+        rows = stack_rows(blocks, self._signals_buf.shape[1])
+        self._signals_buf = grow_rows(self._signals_buf, n, rows)
+        self._signals = self._signals_buf[0:n + len(rows)]
+
+
+
+#%%  Streaming reading
+
+class ResFrameStream: 
+    """
+    Reads the frames one by one without keeping them in memory. 
+    Signature, text and header are read once in the constructor
+    
+    with ResFrameStream("GG2") as stream: 
+        k = stream.rad_names.index('Te')
+        te_max = max(fr.profiles[k].array.max() for fr in stream)
+    """
+    def __init__(self, filename): 
+        self.filename = filename
+        self.file = open(filename, "rb")
+        try: 
+            _ = read_signature_packet(self.file)
+            self.model, self.log = read_text(self.file)
+            self.const_names = get_const_names(self.log)
+            self.header = ResHeader(self.file)
+            
+            # the first frame is needed to correct the profile names
+            self._first_frame = self._next_frame()
+        except BaseException: 
+            self.file.close()
+            raise
+        
+        info = self.header.rad_out_info
+        n = 0 if self._first_frame is None else len(self._first_frame.profiles)
+        info.names, info.scales = actualize_profile_names(info.names, info.scales, n)
+        self.rad_names = info.names
+        self.time_names = self.header.time_out_info.names
+
+    def _next_frame(self): 
+        try: 
+            return ResFrame(self.file)
+        except EndOfFile: 
+            return None
+        except BaseException as e: 
+            print(type(e).__name__, ": '", e, "'")
+            print('WARNING! Not all the frames have been readed!')
+            return None
+
+    def __iter__(self): 
+        if self.file.closed: 
+            raise AstraResError('Frames of the stream can be read only once')
+        
+        frame, self._first_frame = self._first_frame, None
+        while frame is not None: 
+            yield frame
+            frame = None  # to release the memory before the next frame is read
+            frame = self._next_frame()
+        self.close()
+
+    def close(self): 
+        self.file.close()
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, *args): 
+        self.close()
+
+def iter_frames(filename): 
+    """
+    Yields the frames of the res-file one by one. 
+    Only one frame is kept in memory
+    """
+    with ResFrameStream(filename) as stream: 
+        yield from stream
+
+#%%  Detached copies and parallel loading
+
+def res_to_arrays(res, quantized=False): 
+    # ResFile in the columnar form as (json-compatible dict, dict of arrays), 
+    # frames are not included (see res_from_arrays). 
+    # quantized: profiles are given as int16 codes (see QuantizedProfileStore)
+    header, header_arrays = _header_to_dict(res.header)
+    meta = {
+        'filename': res.filename, 'filesize': res.filesize, 
+        'model': res.model, 'log': res.log, 'const_names': res.const_names, 
+        'rad_names': list(res.rad_names), 'time_names': list(res.time_names), 
+        'header': header, 'projection': _projection_to_dict(res.projection)
+    }
+    arrays = {
+        'rad_times': np.asarray(res.rad_times, dtype=np.float64), 
+        'signals': res.signals_matrix(), 
+        'const_values': res.const_matrix()
+    }
+    if quantized: 
+        if isinstance(res._profiles, QuantizedProfileStore): 
+            store = res._profiles
+            codes = store.codes, store.scale, store.down, store.code_lengths, store.lengths
+        elif res._last_file_pos is None: 
+            raise AstraResError('int16 codes are not kept in the detached ResFile')
+        else: 
+            codes = quantize_store(res.frames, len(res.rad_names))
+        for key, value in zip(('codes', 'scale', 'down', 'code_lengths', 'lengths'), codes): 
+            arrays[key] = value
+    else: 
+        store = res.profile_store()
+        arrays['profiles'], arrays['lengths'] = store.data, store.lengths
+    for key, value in header_arrays.items(): 
+        arrays['header.' + key] = value
+    return meta, arrays
+
+def _projection_to_dict(projection): 
+    # json-compatible form of Projection
+    return {key: None if value is None else np.asarray(value).tolist() 
+            for key, value in (('profiles', projection.profiles), ('signals', projection.signals))}
+
+def _projection_from_dict(d): 
+    if d is None: # exported before the projection was kept
+        return ALL_DATA
+    return Projection(None if d['profiles'] is None else np.array(d['profiles'], dtype=bool), 
+                      None if d['signals'] is None else np.array(d['signals'], dtype=np.int64))
+
+def _detached_frame(i): 
+    raise AstraResError('Frames are not kept in the detached ResFile, use profile_store() and signals_matrix()')
+
+def res_from_arrays(meta, arrays, dtype=np.float64): 
+    """
+    ResFile restored from res_to_arrays() without the access to the file. 
+    Profiles and signals are available through the columnar queries 
+    (find_profile, profile_store, signals_matrix, ...), frames are not kept. 
+    Profiles given by int16 codes are dequantized at the access to the values of the given dtype
+    """
+    res = ResFile.__new__(ResFile)
+    res.filename, res.filesize = meta['filename'], meta['filesize']
+    res.model, res.log, res.const_names = meta['model'], meta['log'], meta['const_names']
+    header_arrays = {key[7:]: value for key, value in arrays.items() if key.startswith('header.')}
+    res.header = _header_from_dict(meta['header'], header_arrays)
+    
+    res.lazy = False
+    res.stats, res.time_window = None, None
+    res._projection_request, res.projection = (None, None), _projection_from_dict(meta.get('projection'))
+    res.compression, res.source = None, None
+    res.decoding = ProfileDecoding('codes' in arrays, arrays['profiles'].dtype if 'profiles' in arrays else dtype)
+    res._frame_index, res._mmap, res._reader, res._last_file_pos = None, None, None, None
+    
+    if 'codes' in arrays: 
+        store = QuantizedProfileStore(arrays['codes'], arrays['scale'], arrays['down'], 
+                                      arrays['code_lengths'], arrays['lengths'], dtype)
+    else: 
+        store = ProfileStore.__new__(ProfileStore)
+        store._buf = arrays['profiles']
+        store.lengths = np.asarray(arrays['lengths'], dtype=np.int64)
+        store.offsets = np.concatenate([[0], np.cumsum(store.lengths)]).astype(np.int64)
+    res._profiles = store
+    res._regrid_cache = {}
+    res.frames = LazyList(_detached_frame, store.get_frame_count())
+    
+    res.rad_names, res.time_names = meta['rad_names'], meta['time_names']
+    res._header_rad_names = list(res.rad_names), list(res.header.rad_out_info.scales)
+    res._rad_index, res._time_index = name_map(res.rad_names), name_map(res.time_names)
+    res.rad_times = arrays['rad_times']
+    res._signals_buf = res._signals = arrays['signals']
+    res.time_times = res._signals[:, 0]
+    res.time_range = time_span(res.rad_times, res.time_times)
+    res._const_values = arrays['const_values']
+    return res
+
+_SHM_ALIGN = 64
+
+def _arrays_to_shm(arrays): 
+    # all the arrays in one shared memory block: returns shm, layout [(key, dtype, shape, offset), ...]
+    layout, size = [], 0
+    for key, value in arrays.items(): 
+        layout.append((key, value.dtype.str, value.shape, size))
+        size += -(-value.nbytes // _SHM_ALIGN)*_SHM_ALIGN
+    
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (key, dtype, shape, offset) in layout: 
+        dest = np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+        dest[...] = arrays[key]
+        del dest
+    return shm, layout
+
+def _arrays_from_shm(name, layout): 
+    # the arrays are copied from the shared memory block, the block is released
+    shm = shared_memory.SharedMemory(name=name)
+    try: 
+        data = np.frombuffer(shm.buf, np.uint8).copy()
+    finally: 
+        shm.close()
+        shm.unlink()
+    return {key: np.ndarray(shape, dtype, buffer=data, offset=offset) for (key, dtype, shape, offset) in layout}
+
+def _load_worker(task): 
+    # parses one res-file in the worker process, 
+    # the arrays are passed back through the shared memory
+    path, kwargs = task
+    try: 
+        meta, arrays = res_to_arrays(ResFile(path, **kwargs))
+    except Exception as e: 
+        return path, None, None, repr(e)
+    shm, layout = _arrays_to_shm(arrays)
+    del arrays
+    name = shm.name
+    shm.close()
+    return path, meta, name, layout
+
+class ResFileSet: 
+    """
+    Set of the res-files (e.g. parameter scan) loaded by load_many(). 
+    runs - list of the detached ResFile (see res_from_arrays), in the order of paths. 
+    errors - dict {path: message} for the files that could not be read
+    """
+    def __init__(self, paths=(), runs=(), errors=None): 
+        self.paths = list(paths)
+        self.runs = list(runs)
+        self.errors = {} if errors is None else errors
+        self._path_index = name_map(self.paths)
+
+    def __len__(self): 
+        return len(self.runs)
+
+    def __iter__(self): 
+        return iter(self.runs)
+
+    def __getitem__(self, key): 
+        # index or path
+        if isinstance(key, str): 
+            try: 
+                key = self._path_index[key]
+            except KeyError: 
+                raise AstraResError('no res-file ' + key + ' in the set')
+        return self.runs[key]
+
+    def stack_signal(self, name, times=None): 
+        """
+        Time signal of all the runs on the common time grid by one vectorized interpolation. 
+        Runs without the signal (see time_names, also narrowed by the signals of ResFile) are skipped. 
+        times: common grid, by default - uniform grid over the time interval of all the runs 
+               with the maximal number of the slices. 
+        Returns times, yy (n_runs x n_times, NaN outside the time interval of the run), 
+                paths of the runs
+        """
+        runs = [(path, res) for path, res in zip(self.paths, self.runs) 
+                if name in res.time_names]
+        signals = [res.find_signal(name) for _, res in runs]
+        if times is None: 
+            times = self._common_times([tt for tt, _ in signals])
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        if len(runs) == 0: 
+            return times, np.zeros((0, len(times))), []
+        
+        lengths = np.array([len(tt) for tt, _ in signals])
+        x = np.concatenate([tt for tt, _ in signals])
+        y = np.concatenate([yy for _, yy in signals])
+        yy = ragged_interp(times, x, y, lengths)
+        
+        # no extrapolation
+        last = np.cumsum(lengths) - 1
+        first = last - lengths + 1
+        with np.errstate(invalid='ignore'): 
+            outside = (times[None, :] < x[np.maximum(first, 0)][:, None]) | (times[None, :] > x[np.maximum(last, 0)][:, None])
+        yy[outside | (lengths == 0)[:, None]] = np.nan
+        return times, yy, [path for path, _ in runs]
+
+    def _common_times(self, time_arrays): 
+        time_arrays = [tt for tt in time_arrays if len(tt) > 0]
+        if len(time_arrays) == 0: 
+            return np.zeros(0)
+        lo = min(tt[0] for tt in time_arrays)
+        hi = max(tt[-1] for tt in time_arrays)
+        return np.linspace(lo, hi, max(len(tt) for tt in time_arrays))
+
+def load_many(paths, workers=None, **kwargs): 
+    """
+    Reads many res-files in the process pool of the given size (default - number of CPUs). 
+    Parsed arrays are passed back through the shared memory, not as pickled frames. 
+    kwargs are passed to ResFile (dequantize, dtype). 
+    Returns ResFileSet, the files that could not be read are reported in its errors
+    """
+    paths = [str(p) for p in paths]
+    return _collect_runs(_pool_map(_load_worker, [(path, kwargs) for path in paths], workers))
+
+def _pool_map(func, tasks, workers=None): 
+    # func over the tasks in the process pool (in this process if workers <= 1), results are in order
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers <= 1: 
+        yield from map(func, tasks)
+        return
+    
+    # the shared memory blocks created by the workers are unlinked by this process
+    from multiprocessing import resource_tracker
+    resource_tracker.ensure_running()
+    with multiprocessing.get_context().Pool(workers) as pool: 
+        yield from pool.imap(func, tasks)
+
+def _collect_runs(results): 
+    ok_paths, runs, errors = [], [], {}
+    for path, meta, name, layout in results: 
+        if meta is None: 
+            print('WARNING! ' + path + ' is not read: ' + layout)
+            errors[path] = layout
+            continue
+        ok_paths.append(path)
+        runs.append(res_from_arrays(meta, _arrays_from_shm(name, layout)))
+    return ResFileSet(ok_paths, runs, errors)
+
+#%%  Columnar export
+
+EXPORT_VERSION = 1
+EXPORT_EXT = {'npz': '.npz', 'hdf5': '.h5'}
+_HDF5_MAGIC = b'\x89HDF\r\n\x1a\n'
+_EXPORT_CHUNK = 1<<16
+
+def export_res(res, path, format='npz', compress=False, quantized=False): 
+    # see ResFile.export
+    if format not in EXPORT_EXT: 
+        raise AstraResError('Unknown export format ' + str(format))
+    if (format == 'hdf5')and(h5py is None): 
+        raise AstraResError('h5py is required for the export to HDF5')
+    
+    meta, arrays = res_to_arrays(res, quantized)
+    meta['export_version'] = EXPORT_VERSION
+    arrays['time_times'] = np.asarray(res.time_times, dtype=np.float64)
+    arrays['offsets'] = np.concatenate([[0], np.cumsum(arrays['lengths'])]).astype(np.int64)
+    
+    tmp = str(path) + '.tmp'
+    if format == 'npz': 
+        arrays['meta'] = np.array(json.dumps(meta))
+        with open(tmp, 'wb') as f: 
+            (np.savez_compressed if compress else np.savez)(f, **arrays)
+    else: 
+        with h5py.File(tmp, 'w') as f: 
+            f.attrs['meta'] = json.dumps(meta)
+            for key, value in arrays.items(): 
+                f.create_dataset(key, data=value, chunks=_hdf5_chunks(key, value), 
+                                 compression='gzip' if compress and value.size > 0 else None)
+    os.replace(tmp, path)
+
+def _hdf5_chunks(key, value): 
+    if value.size == 0 or value.ndim == 0: 
+        return None
+    if key in ('profiles', 'codes'): # one chunk holds a piece of one profile of the consecutive frames
+        return (1, min(value.shape[1], _EXPORT_CHUNK))
+    return True
+
+def load_export(path, use_mmap=True, dtype=np.float64): 
+    """
+    ResFile written by ResFile.export (detached, see res_from_arrays). 
+    Arrays of the uncompressed npz are memory-mapped if use_mmap. 
+    Profiles of the quantized archive are dequantized at the access to the values of dtype
+    """
+    with open(path, 'rb') as f: 
+        magic = f.read(len(_HDF5_MAGIC))
+    
+    if magic == _HDF5_MAGIC: 
+        if h5py is None: 
+            raise AstraResError('h5py is required to read ' + str(path))
+        with h5py.File(path, 'r') as f: 
+            meta = json.loads(f.attrs['meta'])
+            arrays = {key: f[key][()] for key in f.keys()}
+    else: 
+        arrays = _read_npz(path, use_mmap)
+        meta = json.loads(str(arrays.pop('meta')))
+    
+    if meta.get('export_version') != EXPORT_VERSION: 
+        raise AstraResError('Unknown version of the exported file ' + str(path))
+    return res_from_arrays(meta, arrays, dtype)
+
+def _read_npz(path, use_mmap): 
+    # members of npz, uncompressed ones are mapped directly from the file
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f: 
+        for info in zf.infolist(): 
+            key = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if use_mmap and (info.compress_type == zipfile.ZIP_STORED): 
+                array = _map_npy_member(path, f, info)
+                if array is not None: 
+                    arrays[key] = array
+                    continue
+            with zf.open(info) as member: 
+                arrays[key] = np.lib.format.read_array(member)
+    return arrays
+
+def _map_npy_member(path, f, info): 
+    # memmap of the stored npy member or None if it can not be mapped
+    f.seek(info.header_offset)
+    local_header = f.read(30)
+    name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+    f.seek(info.header_offset + 30 + name_len + extra_len)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0): 
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else: 
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    
+    if dtype.hasobject or len(shape) == 0 or 0 in shape: 
+        return None
+    return np.memmap(path, dtype, 'r', f.tell(), shape, 'F' if fortran else 'C')
+
+def _export_worker(task): 
+    path, out, format, compress, quantized, kwargs = task
+    try: 
+        export_res(ResFile(path, **kwargs), out, format, compress, quantized)
+    except Exception as e: 
+        return path, None, repr(e)
+    return path, out, None
+
+def convert_dir(src, dst=None, format='npz', compress=False, quantized=False, workers=None, **kwargs): 
+    """
+    Exports all the res-files of the directory src to the directory dst (default - src) 
+    in the process pool (see ResFile.export, load_many). 
+    Returns the list of the written files and dict {path: message} of the files that are not converted
+    """
+    if format not in EXPORT_EXT: 
+        raise AstraResError('Unknown export format ' + str(format))
+    dst = src if dst is None else dst
+    os.makedirs(dst, exist_ok=True)
+    skip = tuple(EXPORT_EXT.values()) + (RESIDX_EXT, '.tmp')
+    names = sorted(name for name in os.listdir(src) 
+                   if os.path.isfile(os.path.join(src, name)) and not name.endswith(skip))
+    tasks = [(os.path.join(src, name), os.path.join(dst, name + EXPORT_EXT[format]), 
+              format, compress, quantized, kwargs) for name in names]
+    
+    written, errors = [], {}
+    for path, out, error in _pool_map(_export_worker, tasks, workers): 
+        if out is None: 
+            errors[path] = error
+        else: 
+            written.append(out)
+    return written, errors
+
+#%%  Catalogue
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, 
+    path TEXT UNIQUE NOT NULL, 
+    size INTEGER, 
+    mtime_ns INTEGER, 
+    error TEXT, 
+    rd_name TEXT, 
+    eq_name TEXT, 
+    version TEXT, 
+    version_num TEXT, 
+    date TEXT, 
+    t_start REAL, 
+    t_end REAL
+);
+CREATE TABLE IF NOT EXISTS names (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE, 
+    kind TEXT NOT NULL, 
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_eq_name ON files(eq_name);
+CREATE INDEX IF NOT EXISTS files_rd_name ON files(rd_name);
+CREATE INDEX IF NOT EXISTS files_version ON files(version_num);
+CREATE INDEX IF NOT EXISTS files_t_end ON files(t_end);
+CREATE INDEX IF NOT EXISTS names_kind_name ON names(kind, name, file_id);
+CREATE INDEX IF NOT EXISTS names_file ON names(file_id);
+"""
+
+_NAME_KINDS = {'profiles': 'profile', 'signals': 'signal', 'consts': 'const'}
+
+def res_metadata(path): 
+    # header metadata of the res-file for the catalogue (see ResFile(frames=False))
+    res = ResFile(path, frames=False)
+    h = res.header
+    version = re.search(r'\d+(\.\d+)*', h.version)
+    year = h.year + 1900 if h.year < 1900 else h.year
+    t_start, t_end = res.time_range if res.time_range is not None else (None, None)
+    return {
+        'rd_name': h.rd_name, 'eq_name': h.eq_name, 'version': h.version, 
+        'version_num': version.group(0) if version else '', 
+        'date': '%04d-%02d-%02d %02d:%02d' % (year, h.month, h.day, h.hour, h.minute), 
+        't_start': t_start, 't_end': t_end, 
+        'profiles': list(res.rad_names), 'signals': list(res.time_names), 'consts': list(res.const_names)
+    }
+
+def _catalog_worker(task): 
+    path, size, mtime = task
+    try: 
+        return path, size, mtime, res_metadata(path), None
+    except Exception as e: 
+        return path, size, mtime, None, repr(e)
+
+class ResCatalog: 
+    """
+    SQLite catalogue of the res-files: header metadata, names of the profiles, signals 
+    and constants, time ranges. 
+    scan() adds the new and changed files (size or mtime), query() finds the files
+    """
+    def __init__(self, db_path): 
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(CATALOG_SCHEMA)
+
+    def close(self): 
+        self.conn.close()
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        self.close()
+
+    def scan(self, dirs, recursive=True, workers=None): 
+        """
+        Adds the res-files of the directories to the catalogue. 
+        Files with unchanged size and mtime are skipped, deleted files are removed. 
+        Files that are not res-files are remembered with the error and are not read again. 
+        Returns the numbers of the read and the skipped files
+        """
+        dirs = [os.fspath(d) for d in ([dirs] if isinstance(dirs, (str, os.PathLike)) else dirs)]
+        known = {path: (size, mtime) for path, size, mtime in 
+                 self.conn.execute('SELECT path, size, mtime_ns FROM files')}
+        
+        tasks, seen = [], set()
+        for path in self._walk(dirs, recursive): 
+            try: 
+                key = _file_key(path)
+            except OSError: # deleted after the listing of the directory
+                continue
+            seen.add(path)
+            if known.get(path) != key: 
+                tasks.append((path,) + key)
+        
+        with self.conn: 
+            for path, size, mtime, meta, error in _pool_map(_catalog_worker, tasks, workers): 
+                self._store(path, size, mtime, meta, error)
+            
+            # only the files of the scanned part of the tree can be gone
+            if recursive: 
+                roots = tuple(os.path.join(os.path.abspath(d), '') for d in dirs)
+                gone = [(path,) for path in known if path.startswith(roots) and path not in seen]
+            else: 
+                roots = set(os.path.abspath(d) for d in dirs)
+                gone = [(path,) for path in known if (os.path.dirname(path) in roots)and(path not in seen)]
+            self.conn.executemany('DELETE FROM files WHERE path = ?', gone)
+        return len(tasks), len(seen) - len(tasks)
+
+    def _walk(self, dirs, recursive): 
+        skip = tuple(EXPORT_EXT.values()) + (RESIDX_EXT, '.tmp')
+        db = os.path.abspath(self.db_path)
+        db_files = {db, db + '-journal', db + '-wal', db + '-shm'}
+        for d in dirs: 
+            for root, subdirs, names in os.walk(os.path.abspath(d)): 
+                for name in sorted(names): 
+                    path = os.path.join(root, name)
+                    if (not name.endswith(skip))and(path not in db_files): 
+                        yield path
+                if not recursive: 
+                    break
+
+    def _store(self, path, size, mtime, meta, error): 
+        self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+        if meta is None: 
+            self.conn.execute('INSERT INTO files (path, size, mtime_ns, error) VALUES (?, ?, ?, ?)', 
+                              (path, size, mtime, error))
+            return
+        
+        cur = self.conn.execute(
+            'INSERT INTO files (path, size, mtime_ns, rd_name, eq_name, version, version_num, date, t_start, t_end) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', 
+            (path, size, mtime, meta['rd_name'], meta['eq_name'], meta['version'], meta['version_num'], 
+             meta['date'], meta['t_start'], meta['t_end']))
+        file_id = cur.lastrowid
+        self.conn.executemany('INSERT INTO names (file_id, kind, name) VALUES (?, ?, ?)', 
+                              [(file_id, kind, name) for key, kind in _NAME_KINDS.items() for name in meta[key]])
+
+    def query(self, rd_name=None, eq_name=None, version=None, profiles=(), signals=(), consts=(), 
+              t_end_min=None, t_end_max=None, t_start_min=None, t_start_max=None, path=None): 
+        """
+        Paths of the catalogued res-files (sorted) that satisfy all the given conditions. 
+        rd_name, eq_name, path: glob patterns ('*', '?'), 
+        version: glob pattern for the version number ('7*' - all the versions 7.x), 
+        profiles, signals, consts: names that must be present in the file, 
+        t_end_min ... t_start_max: bounds of the time range
+        """
+        where, args = ['error IS NULL'], []
+        for column, pattern in [('rd_name', rd_name), ('eq_name', eq_name), 
+                                ('version_num', version), ('path', path)]: 
+            if pattern is not None: 
+                where.append(column + ' GLOB ?')
+                args.append(pattern)
+        for column, op, value in [('t_end', '>=', t_end_min), ('t_end', '<=', t_end_max), 
+                                  ('t_start', '>=', t_start_min), ('t_start', '<=', t_start_max)]: 
+            if value is not None: 
+                where.append(column + ' ' + op + ' ?')
+                args.append(value)
+        for kind, names in [('profile', profiles), ('signal', signals), ('const', consts)]: 
+            for name in ([names] if isinstance(names, str) else names): 
+                where.append('id IN (SELECT file_id FROM names WHERE kind = ? AND name = ?)')
+                args.extend([kind, name])
+        
+        sql = 'SELECT path FROM files WHERE ' + ' AND '.join(where) + ' ORDER BY path'
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def open(self, resfile_kwargs=None, **conditions): 
+        # opened ResFile for each path found by query(**conditions)
+        for path in self.query(**conditions): 
+            yield ResFile(path, **(resfile_kwargs or {}))
+
+    def errors(self): 
+        # {path: message} of the files that could not be read
+        return dict(self.conn.execute('SELECT path, error FROM files WHERE error IS NOT NULL'))
 
+#%%  Comparison of the runs
 
+def _common_names(names_a, names_b, keep_a=None, keep_b=None): 
+    # [(name, index_a, index_b)] of the names of both lists (first occurrences), 
+    # keep_a(k), keep_b(k): the quantity is read (see Projection)
+    index_b = name_map(names_b)
+    result = []
+    for name, ka in name_map(names_a).items(): 
+        kb = index_b.get(name)
+        if (kb is not None)and((keep_a is None)or keep_a(ka))and((keep_b is None)or keep_b(kb)): 
+            result.append((name, ka, kb))
+    return result
+
+def _time_alignment(tq, t): 
+    # linear interpolation of the rows given at the times t (increasing) to the times tq: 
+    # returns i0, i1, w and the mask of tq inside the range of t, None if the times are the same
+    tq, t = np.asarray(tq, dtype=np.float64), np.asarray(t, dtype=np.float64)
+    if np.array_equal(tq, t): 
+        return None
+    if len(t) < 2: 
+        i0 = i1 = np.zeros(len(tq), dtype=np.int64)
+        return i0, i1, np.zeros(len(tq)), (tq == t[0]) if len(t) > 0 else np.zeros(len(tq), dtype=bool)
+    i1 = np.clip(np.searchsorted(t, tq), 1, len(t) - 1)
+    i0 = i1 - 1
+    dt = t[i1] - t[i0]
+    with np.errstate(invalid='ignore', divide='ignore'): 
+        w = np.clip(np.where(dt > 0, (tq - t[i0])/dt, 0.0), 0.0, 1.0)
+    return i0, i1, w, (tq >= t[0])&(tq <= t[-1])
+
+def _align_rows(y, alignment): 
+    # rows of y (2d) at the times of the alignment (see _time_alignment)
+    if alignment is None: 
+        return y
+    i0, i1, w, inside = alignment
+    return apply_interp_weights(y, i0[inside], i1[inside], w[inside][:, None])
+
+def _block_stats(a, b, rtol, atol): 
+    # see _error_stats, returns the sum of squares instead of rms
+    d = np.subtract(a, b)
+    np.abs(d, out=d)
+    max_abs = d.max(axis=1, initial=0.0)
+    for i in np.flatnonzero(np.isnan(max_abs)): # NaN or the infinite values, usually there are none
+        bad = np.isnan(d[i])
+        av, bv = a[i, bad], b[i, bad]
+        d[i, bad] = np.where((av == bv)|(np.isnan(av) & np.isnan(bv)), 0.0, np.inf)
+        max_abs[i] = d[i].max()
+    sq = np.einsum('ij,ij->i', d, d)
+    
+    rel = np.abs(b)
+    np.divide(d, rel, out=rel)
+    max_rel = np.fmax.reduce(rel, axis=1, initial=0.0)  # 0/0 (NaN) is ignored
+    max_rel[np.isinf(max_abs)] = np.inf
+    
+    # d <= atol + rtol*|b| is checked only for the rows, where it does not follow from the maxima
+    ok = (max_abs <= atol)|(max_rel <= rtol)
+    for i in np.flatnonzero(~ok & np.isfinite(max_abs)): 
+        tol = np.abs(b[i])
+        tol *= rtol
+        tol += atol
+        ok[i] = np.all((d[i] <= tol)|((d[i] == 0.0)&np.isnan(tol)))
+    return max_abs, sq, max_rel, ok
+
+def _error_stats(a, b, rtol, atol): 
+    # per row of 2d arrays a and b (reference): max absolute, rms and max relative error, 
+    # all close (as np.isclose(a, b, rtol, atol, equal_nan=True)). 
+    # Values NaN only in one of the arrays give the infinite error
+    m, n = a.shape
+    max_abs, sq, max_rel, ok = np.zeros(m), np.zeros(m), np.zeros(m), np.ones(m, dtype=bool)
+    step = max(1, _CACHE_BLOCK // max(m, 1))
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'): 
+        for j in range(0, n, step): 
+            block = _block_stats(a[:, j:j + step], b[:, j:j + step], rtol, atol)
+            np.maximum(max_abs, block[0], out=max_abs)
+            sq += block[1]
+            np.maximum(max_rel, block[2], out=max_rel)
+            ok &= block[3]
+        return max_abs, np.sqrt(sq/max(n, 1)), max_rel, ok
+
+def _quantity_table(names, rows): 
+    # columnar table of the errors: rows - list of the results of _error_stats (per chunk)
+    keys = ('max_abs', 'rms', 'max_rel', 'ok')
+    table = {'names': [name for name, _, _ in names]}
+    for i, key in enumerate(keys): 
+        parts = [r[i] for r in rows]
+        table[key] = np.concatenate(parts) if parts else np.zeros(0, dtype=bool if key == 'ok' else np.float64)
+    return table
+
+def _chunks(names, width): 
+    # the rows are compared by chunks of ~_BULK_CHUNK values
+    step = max(1, _BULK_CHUNK // max(width, 1))
+    return [names[i:i + step] for i in range(0, len(names), step)]
+
+def _diff_signals(res_a, res_b, rtol, atol): 
+    names = _common_names(res_a.time_names[1:], res_b.time_names[1:])   # without time
+    alignment = _time_alignment(res_a.time_times, res_b.time_times)
+    sa, sb = res_a.signals_matrix(), res_b.signals_matrix()
+    ya = sa if alignment is None else sa[alignment[3]]
+    rows = []
+    for chunk in _chunks(names, len(ya)): 
+        ca = [ka + 1 for _, ka, _ in chunk]
+        cb = [kb + 1 for _, _, kb in chunk]
+        rows.append(_error_stats(ya[:, ca].T, _align_rows(sb[:, cb], alignment).T, rtol, atol))
+    return _quantity_table(names, rows)
+
+def _diff_consts(res_a, res_b, rtol, atol): 
+    ma, mb = res_a.const_matrix(), res_b.const_matrix()
+    names = _common_names(res_a.const_names[0:ma.shape[1]], res_b.const_names[0:mb.shape[1]])
+    alignment = _time_alignment(res_a.rad_times, res_b.rad_times)
+    ya = ma if alignment is None else ma[alignment[3]]
+    ca, cb = [ka for _, ka, _ in names], [kb for _, _, kb in names]
+    rows = [_error_stats(ya[:, ca].T, _align_rows(mb[:, cb], alignment).T, rtol, atol)] if names else []
+    return _quantity_table(names, rows)
+
+def _diff_profiles(res_a, res_b, rtol, atol): 
+    names = _common_names(res_a.rad_names, res_b.rad_names, 
+                          res_a.projection.keeps_profile, res_b.projection.keeps_profile)
+    store_a, store_b = res_a.profile_store(), res_b.profile_store()
+    rows = []
+    if (np.array_equal(res_a.rad_times, res_b.rad_times)and np.array_equal(store_a.lengths, store_b.lengths) 
+        and np.array_equal(store_a.get_row(0), store_b.get_row(0))): 
+        # the same frames and meshes: the flat buffers are compared directly (without copies)
+        for _, ka, kb in names: 
+            rows.append(_error_stats(store_a.get_row(ka)[None, :], store_b.get_row(kb)[None, :], rtol, atol))
+        return _quantity_table(names, rows)
+    
+    # profiles on the mesh of a (see default_rho) or on the mesh of b if only b has the same mesh in all the frames, 
+    # frames of b are interpolated to the times of a
+    rho = res_a.default_rho()
+    if (not res_a._same_mesh(rho))and res_b._same_mesh(res_b.default_rho()): 
+        rho = res_b.default_rho()   # only b has the same mesh in all the frames
+    alignment = _time_alignment(res_a.rad_times, res_b.rad_times)
+    n = store_a.get_frame_count() if alignment is None else int(np.sum(alignment[3]))
+    for chunk in _chunks(names, n*len(rho)): 
+        ya = res_a._profiles_on_grid([ka for _, ka, _ in chunk], rho)
+        yb = res_b._profiles_on_grid([kb for _, _, kb in chunk], rho)
+        if alignment is not None: 
+            ya = ya[:, alignment[3]]
+            yb = np.array([_align_rows(y, alignment) for y in yb])
+        rows.append(_error_stats(ya.reshape(len(chunk), -1), yb.reshape(len(chunk), -1), rtol, atol))
+    return _quantity_table(names, rows)
+
+def _header_differences(header_a, header_b): 
+    # {attribute: (value_a, value_b)}, names of the output infos are compared as the name lists
+    da, arrays_a = _header_to_dict(header_a)
+    db, arrays_b = _header_to_dict(header_b)
+    result = {}
+    for key in sorted(set(da['attrs']) | set(db['attrs'])): 
+        va, vb = da['attrs'].get(key), db['attrs'].get(key)
+        if va != vb: 
+            result[key] = (va, vb)
+    for key in sorted((set(arrays_a) | set(arrays_b)) - set(da['raw']) - set(db['raw'])): 
+        va, vb = arrays_a.get(key), arrays_b.get(key)
+        if (va is None)or(vb is None)or(not np.array_equal(va, vb)): 
+            result[key] = (va, vb)
+    for key in sorted(set(da['infos']) | set(db['infos'])): 
+        va, vb = da['infos'].get(key, {}).get('scales'), db['infos'].get(key, {}).get('scales')
+        if va != vb: 
+            result[key + '.scales'] = (va, vb)
+    return result
+
+def _short(value, width=60): 
+    s = repr(value) if not isinstance(value, np.ndarray) else np.array2string(value, threshold=6)
+    s = ' '.join(s.split())
+    return s if len(s) <= width else s[0:width - 3] + '...'
+
+def _name_differences(names_a, names_b): 
+    set_a, set_b = set(names_a), set(names_b)
+    return [n for n in names_a if n not in set_b], [n for n in names_b if n not in set_a]
+
+class ResDiff: 
+    """
+    Differences of two runs, b is the reference (see diff). 
+    header:   {attribute: (value_a, value_b)} 
+    model:    unified diff of the model texts (list of lines) 
+    names:    {'rad'|'time'|'const': (only in a, only in b)}, only different lists 
+    frames:   {'rad'|'time': (count_a, count_b, compared)} - numbers of the frames and time slices, 
+              compared - number of the times of a inside the time range of b 
+    signals, profiles, consts: errors of the common quantities as columns 
+              {'names': [...], 'max_abs': array, 'rms': array, 'max_rel': array, 'ok': bool array}, 
+              signals are aligned on time, profiles and consts on time (of the frames) and rho 
+    """
+    def __init__(self, rtol, atol): 
+        self.rtol, self.atol = rtol, atol
+        self.header, self.model, self.names, self.frames = {}, [], {}, {}
+        self.signals = self.profiles = self.consts = None
+
+    def failed(self): 
+        # [(kind, name)] of the quantities that are not close
+        result = []
+        for kind in ('signals', 'profiles', 'consts'): 
+            table = getattr(self, kind)
+            result.extend((kind, table['names'][i]) for i in np.flatnonzero(~table['ok']))
+        return result
+
+    @property
+    def equal(self): 
+        counts_differ = any((na != nb)or(nc != na) for na, nb, nc in self.frames.values())
+        return not (self.header or self.model or self.names or counts_differ or self.failed())
+
+    def report(self, max_lines=20): 
+        lines = ['rtol %g, atol %g: %s' % (self.rtol, self.atol, 'equal' if self.equal else 'DIFFERENT')]
+        for key, (va, vb) in self.header.items(): 
+            lines.append('header %s: %s != %s' % (key, _short(va), _short(vb)))
+        if self.model: 
+            lines.append('model text differs (%d lines of diff)' % len(self.model))
+        for kind, (only_a, only_b) in self.names.items(): 
+            lines.append('%s names only in a (%d): %s, only in b (%d): %s' % 
+                         (kind, len(only_a), _short(only_a), len(only_b), _short(only_b)))
+        for kind, (na, nb, nc) in self.frames.items(): 
+            if (na != nb)or(nc != na): 
+                lines.append('%s times: %d in a, %d in b, %d compared' % (kind, na, nb, nc))
+        failed = self.failed()
+        for kind, name in failed[0:max_lines]: 
+            table = getattr(self, kind)
+            i = table['names'].index(name)
+            lines.append('%-8s %-10s max %.3e  rms %.3e  rel %.3e' % 
+                         (kind, name, table['max_abs'][i], table['rms'][i], table['max_rel'][i]))
+        if len(failed) > max_lines: 
+            lines.append('... %d more' % (len(failed) - max_lines))
+        return '\n'.join(lines)
+
+    def __repr__(self): 
+        return self.report()
+
+def diff(res_a, res_b, rtol=1e-5, atol=1e-8): 
+    """
+    Comparison of the run res_a with the reference run res_b (ResFile): 
+    header, model text and name lists are compared as they are, 
+    signals, profiles and const values of the common names are aligned 
+    (b is interpolated to the times of a, profiles are compared on the common mesh, see _diff_profiles) 
+    and compared by the vectorized passes. Returns ResDiff
+    """
+    result = ResDiff(rtol, atol)
+    result.header = _header_differences(res_a.header, res_b.header)
+    result.model = list(difflib.unified_diff(res_a.model, res_b.model, 'a', 'b', lineterm=''))
+    for kind, na, nb in [('rad', res_a.rad_names, res_b.rad_names), ('time', res_a.time_names, res_b.time_names), 
+                         ('const', res_a.const_names, res_b.const_names)]: 
+        only = _name_differences(na, nb)
+        if only[0] or only[1]: 
+            result.names[kind] = only
+    for kind, ta, tb in [('rad', res_a.rad_times, res_b.rad_times), ('time', res_a.time_times, res_b.time_times)]: 
+        alignment = _time_alignment(ta, tb)
+        result.frames[kind] = (len(ta), len(tb), len(ta) if alignment is None else int(np.sum(alignment[3])))
+    
+    result.signals = _diff_signals(res_a, res_b, rtol, atol)
+    result.profiles = _diff_profiles(res_a, res_b, rtol, atol)
+    result.consts = _diff_consts(res_a, res_b, rtol, atol)
+    return result
 
 #%%  
 
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of astrares on the synthetic res-files
+
+    python astra_bench.py --frames 20000 --rho 100 --ragged 10 --out new.json
+    python astra_bench.py --frames 20000 --rho 100 --ragged 10 --compare new.json
+
+The synthetic file is the same for the same parameters (fixed seed),
+so the results of the different versions can be compared
+"""
+
+import os
+import sys
+import json
+import inspect
+import time
+import struct
+import argparse
+import tempfile
+import platform
+import subprocess
+import numpy as np
+
+import astrares
+from astrares import ResFile, ASTRA_RES_SIGNATURE
+
+#%%  Synthetic res-file
+
+def _packet(payload): 
+    size = struct.pack('<l', len(payload))
+    return size + payload + size
+
+def _str_packet(s): 
+    b = s.encode('cp1252')
+    return _packet(bytes([len(b)]) + b)
+
+def _fixed_str(s, n): 
+    return s.encode('cp1252').ljust(n)[0:n]
+
+def _out_info(names, scales): 
+    return (struct.pack('<l', len(names)) + b''.join(_fixed_str(name, 4) for name in names) +
+            np.asarray(scales, dtype='<f8').tobytes())
+
+def _grid_info(ngr=2, n_x=10, narrx=67): 
+    # second packet of the header: ngr grids of the experimental data (see ResHeader)
+    longs = lambda values: np.asarray(values, dtype='<i4').tobytes()
+    gde = [1 + i*n_x for i in range(ngr)]
+    return (longs(range(1, ngr + 1)) + longs([n_x]*ngr) + longs([1]*ngr) + np.zeros(ngr, '<f8').tobytes() + 
+            longs(gde) + longs(gde) + np.zeros(gde[-1] + n_x - 1, '<f4').tobytes() + 
+            b''.join(_fixed_str('X%d' % i, 6) for i in range(narrx)) + longs([0]*narrx) + longs([0]*narrx))
+
+def synthetic_names(n_profiles, n_signals): 
+    # named profiles (after 7 unnamed ones: #radius, #x1, ... #x6) and named time signals
+    prof_names = (['Te', 'Ne', 'Ti'] + ['P%03d' % i for i in range(n_profiles)])[0:n_profiles]
+    sig_names = (['<ne>', 'Wtot'] + ['S%03d' % i for i in range(n_signals)])[0:n_signals]
+    return prof_names, sig_names
+
+def write_synthetic_res(path, n_frames=1000, n_profiles=40, n_rho=100, n_signals=30,
+                        n_slices=2, n_consts=50, ragged_every=0, seed=0): 
+    """
+    Writes the valid res-file: signature, model and log (with constants), header and frames.
+    n_profiles - number of the named profiles (7 unnamed ones are added),
+    ragged_every - every k-th frame has the different radial mesh (0 - the same mesh for all).
+    The content is defined by the parameters and seed
+    """
+    rng = np.random.default_rng(seed)
+    prof_names, sig_names = synthetic_names(n_profiles, n_signals)
+    nprof = 7 + len(prof_names)
+
+    with open(path, 'wb') as f: 
+        f.write(_packet(ASTRA_RES_SIGNATURE.encode('cp1252')))
+        for i in range(5): 
+            f.write(_str_packet('! synthetic model line %d' % i))
+        f.write(_str_packet(ASTRA_RES_SIGNATURE))
+        f.write(_str_packet(' Start file for version 7.0.0'))
+        f.write(_str_packet(' Constants:'))
+        for i in range(n_consts): 
+            f.write(_str_packet('C%03d   =  %.3E' % (i, i*0.1)))
+        f.write(_str_packet(' End of the constants'))
+
+        header = (_fixed_str('synthetic', 40) + _fixed_str('synthetic_eq', 40) +
+                  _fixed_str('Version 7.0, synthetic', 32) + _fixed_str('', 132) +
+                  struct.pack('<7l', 124, 1, 1, 12, 0, n_consts, nprof) +
+                  _out_info(prof_names, [1.0]*len(prof_names)) +
+                  _out_info(sig_names, [1.0]*len(sig_names)) +
+                  struct.pack('<dllll', 0.0, 0, 0, 2, 1) + np.zeros(7, '<i4').tobytes())
+        f.write(_packet(header))
+        f.write(_packet(_grid_info(2)))
+
+        unknown = _packet(np.zeros(128, np.uint8).tobytes())
+        for i in range(n_frames): 
+            t = 0.001*(i + 1)
+            f.write(_packet(struct.pack('<l', n_slices)))
+            if n_slices > 0: 
+                slices = rng.random((n_slices, 1 + len(sig_names)))
+                slices[:, 0] = t - 0.001 + 0.001*np.arange(1, n_slices + 1)/n_slices
+                f.write(_packet(slices.astype('<f8').tobytes()))
+            f.write(_packet(struct.pack('<d', t)))
+            f.write(_packet(rng.random(n_consts).astype('<f8').tobytes()))
+            f.write(unknown)
+
+            n = n_rho + 10 if (ragged_every > 0)and(i % ragged_every == ragged_every - 1) else n_rho
+            rho_codes = np.linspace(-32768, 32767, n).astype('<i2')
+            f.write(_packet(struct.pack('<dd', 1.0, 0.0) + rho_codes.tobytes()))
+            codes = rng.integers(-32768, 32767, (nprof - 1, n), dtype=np.int16).astype('<i2')
+            coefs = rng.random((nprof - 1, 2))
+            for k in range(nprof - 1): 
+                f.write(_packet(struct.pack('<dd', coefs[k, 0], coefs[k, 1]) + codes[k].tobytes()))
+
+#%%  Benchmarks
+
+def _timed(func, repeat): 
+    # minimal wall time of the repeated calls, s
+    best = None
+    for _ in range(repeat): 
+        t = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t
+        best = dt if best is None else min(best, dt)
+    return best
+
+def _version(): 
+    try: 
+        path = os.path.dirname(os.path.abspath(astrares.__file__))
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception: 
+        return None
+
+def run_benchmarks(path, repeat=3): 
+    # {case: seconds}, the cases that are not supported by the tested version of astrares are skipped
+    options = inspect.signature(ResFile.__init__).parameters
+    res = ResFile(path)
+    names = res.rad_names[7:]
+    frames = np.random.default_rng(1).integers(0, len(res.rad_times), 1000)
+
+    def find_profiles(): 
+        for j, i in enumerate(frames): 
+            res.find_profile(names[j % len(names)], index=int(i))
+
+    def find_signals(): 
+        for name in res.time_names: 
+            res.find_signal(name)
+
+    def index_cache(): 
+        ResFile(path, index_cache=True)
+
+    opens = [('open', {}), ('open_mmap', {'use_mmap': True}), ('open_lazy', {'lazy': True}), 
+             ('open_lazy_dequantize', {'dequantize': 'lazy'}), ('open_header_only', {'frames': False}), 
+             ('open_columnar', {'columnar': True})]
+    results = {}
+    for case, kwargs in opens: 
+        if all(key in options for key in kwargs): 
+            results[case] = _timed(lambda: ResFile(path, **kwargs), repeat)
+    results['find_signal_all'] = _timed(find_signals, repeat)
+    results['find_profile_1000'] = _timed(find_profiles, repeat)
+    if hasattr(res, 'profile_store'): 
+        res.profile_store()
+        results['profile_matrix'] = _timed(lambda: res.profile_matrix('Te'), repeat)
+    if hasattr(res, 'regrid')and('columnar' in options): 
+        results['regrid_all'] = _timed(lambda: ResFile(path, columnar=True).regrid(None), 1)
+
+    if 'index_cache' in options: 
+        index_cache()  # the sidecar file is written
+        results['open_index_cache'] = _timed(index_cache, repeat)
+        os.remove(astrares.index_cache_path(path))
+    
+    cases = [case for case, _ in opens] + ['profile_matrix', 'regrid_all', 'open_index_cache']
+    skipped = [case for case in cases if case not in results]
+    if skipped: 
+        print('skipped (not supported by this version): ' + ', '.join(skipped))
+    return results
+
+def compare(old, new): 
+    print('%-24s %10s %10s %8s' % ('case', 'old, s', 'new, s', 'ratio'))
+    for case, t in new['results'].items(): 
+        t_old = old['results'].get(case)
+        ratio = '%8.2f' % (t/t_old) if t_old else '       -'
+        print('%-24s %10s %10.4f %s' % (case, '%.4f' % t_old if t_old else '-', t, ratio))
+
+def main(argv=None): 
+    parser = argparse.ArgumentParser(description='Benchmarks of astrares on the synthetic res-file')
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--profiles', type=int, default=40, help='number of the named profiles')
+    parser.add_argument('--rho', type=int, default=100, help='radial size')
+    parser.add_argument('--signals', type=int, default=30)
+    parser.add_argument('--ragged', type=int, default=0, help='every k-th frame has the different mesh')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='json file for the results')
+    parser.add_argument('--compare', help='json file with the results of the other version')
+    args = parser.parse_args(argv)
+
+    params = {'frames': args.frames, 'profiles': args.profiles, 'rho': args.rho,
+              'signals': args.signals, 'ragged': args.ragged, 'seed': args.seed}
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'synthetic')
+        write_synthetic_res(path, args.frames, args.profiles, args.rho, args.signals,
+                            ragged_every=args.ragged, seed=args.seed)
+        size = os.path.getsize(path)
+        results = run_benchmarks(path, args.repeat)
+
+    report = {'version': _version(), 'python': platform.python_version(), 'numpy': np.__version__,
+              'params': params, 'filesize': size, 'results': results}
+    for case, t in results.items(): 
+        print('%-24s %10.4f s' % (case, t))
+    print('file size %.1f MB, open %.1f MB/s' % (size/1e6, size/1e6/results['open']))
+
+    if args.out: 
+        with open(args.out, 'w') as f: 
+            json.dump(report, f, indent=2)
+    if args.compare: 
+        with open(args.compare) as f: 
+            old = json.load(f)
+        if old['params'] != params: 
+            print('WARNING! Parameters of the compared results are different: ', old['params'])
+        compare(old, report)
+    return report
+
+if __name__ == '__main__': 
+    main(sys.argv[1:])
@@ -5,7 +5,23 @@ Created on Mon Jan 31 12:43:41 2022
 @author: reonid
 """
 
-from astrares import ResFile
+import os
+import pathlib
+import multiprocessing
+import tempfile
+import gzip
+import lzma
+import re
+import threading
+import functools
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from astrares import ResFile, index_cache_path, load_index_cache, iter_frames, ResFrameStream
+from astrares import dequantize_profiles, _convert, ProfileStore, AstraResError, load_many
+from astrares import load_export, convert_dir, h5py, ResCatalog
+from astrares import ByteSource, BytesSource, MmapSource, FileSource, BlockCache, HttpSource, diff
+from astrares import CompressedFile, compress_res_file, SKIPPED_PROFILE
+from astra_bench import write_synthetic_res
 
 class TestFailed(Exception):
     pass
@@ -28,6 +44,781 @@ def test_resfile(filename, expected_version, expected_last_profile):
     print('test ', filename, ' passed')
 
 
+def check_same_content(res1, res2): 
+    if (res1.model != res2.model)or(res1.log != res2.log): 
+        raise TestFailed('Different text sections')
+    if (res1.rad_names != res2.rad_names)or(res1.time_names != res2.time_names): 
+        raise TestFailed('Different names')
+    if res1.get_frame_count() != res2.get_frame_count(): 
+        raise TestFailed('Different frame count')
+    
+    for fr1, fr2 in zip(res1.frames, res2.frames): 
+        if fr1.prof_time_stamp != fr2.prof_time_stamp: 
+            raise TestFailed('Different time stamps')
+        for p1, p2 in zip(fr1.profiles, fr2.profiles): 
+            if not np.array_equal(p1.array, p2.array, equal_nan=True): 
+                raise TestFailed('Different profiles')
+    
+    for name in res1.time_names: 
+        if not np.array_equal(res1.find_signal(name)[1], res2.find_signal(name)[1], equal_nan=True): 
+            raise TestFailed('Different signal %s' % name)
+
+def test_mmap(filename): 
+    res = ResFile(filename)
+    res_mm = ResFile(filename, use_mmap=True)
+    check_same_content(res, res_mm)
+    for a, b in [(res.header._packet0, res_mm.header._packet0), (res.header._packet1, res_mm.header._packet1), 
+                 (res.frames[-1].unknown_packet, res_mm.frames[-1].unknown_packet)]: 
+        if (type(a) is not bytes)or(type(b) is not bytes)or(a != b): 
+            raise TestFailed('Packets are not the same bytes in the mmap mode')
+    
+    with ResFile(filename, lazy=True) as res_lazy: 
+        pass
+    if res_lazy._mmap is not None: 
+        raise TestFailed('Mapping is not released by close()')
+    try: 
+        res_lazy.frames[-1].profiles[-1]
+        raise TestFailed('Lazy frame is read after close()')
+    except AstraResError: 
+        pass
+    print('test mmap ', filename, ' passed')
+
+def test_lazy(filename): 
+    res = ResFile(filename)
+    res_lazy = ResFile(filename, lazy=True)
+    if not np.array_equal(res.rad_times, res_lazy.rad_times): 
+        raise TestFailed('Different rad_times')
+    if not np.array_equal(res.time_times, res_lazy.time_times): 
+        raise TestFailed('Different time_times')
+    check_same_content(res, res_lazy)
+    print('test lazy ', filename, ' passed')
+
+def test_index_cache(filename): 
+    path = index_cache_path(filename)
+    if os.path.exists(path): 
+        os.remove(path)
+    try: 
+        res = ResFile(filename)
+        res1 = ResFile(filename, index_cache=True)   # creates the index file
+        if not os.path.exists(path): 
+            raise TestFailed('Index file is not created')
+        res2 = ResFile(filename, index_cache=True, lazy=True)   # reads the index file
+        check_same_content(res, res1)
+        check_same_content(res, res2)
+        if res.header.version != res2.header.version: 
+            raise TestFailed('Wrong header from the index file')
+        
+        st = os.stat(filename)
+        os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        if load_index_cache(res2): 
+            raise TestFailed('Index file is not invalidated')
+        os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+    finally: 
+        if os.path.exists(path): 
+            os.remove(path)
+    print('test index cache ', filename, ' passed')
+
+def test_refresh(filename, lazy=False): 
+    res = ResFile(filename)
+    with open(filename, 'rb') as f: 
+        data = f.read()
+    
+    frame_pos = [fr.pos for fr in res.frames]
+    # file is growing: incomplete frame, frame boundary, end of file
+    cuts = [frame_pos[1] + 100, frame_pos[len(frame_pos)//2], len(data)]
+    
+    with tempfile.TemporaryDirectory() as tmpdir: 
+        path = os.path.join(tmpdir, 'live')
+        with open(path, 'wb') as f: 
+            f.write(data[:frame_pos[1] - 10])
+        res_live = ResFile(path, lazy=lazy)
+        for cut in cuts: 
+            with open(path, 'ab') as f: 
+                f.write(data[f.tell():cut])
+            res_live.refresh()
+        
+        if not np.array_equal(res.rad_times, res_live.rad_times): 
+            raise TestFailed('Wrong rad_times after refresh')
+        if not np.array_equal(res.time_times, res_live.time_times): 
+            raise TestFailed('Wrong time_times after refresh')
+        check_same_content(res, res_live)
+        del res_live
+    print('test refresh ', filename, ' passed')
+
+def test_refresh_truncated(filename): 
+    res = ResFile(filename)
+    with open(filename, 'rb') as f: 
+        data = f.read()
+    frame_pos = [fr.pos for fr in res.frames]
+    
+    with tempfile.TemporaryDirectory() as tmpdir: 
+        path = os.path.join(tmpdir, 'live')
+        for lazy in [False, True]: 
+            for cut in [frame_pos[len(frame_pos)//2] + 10, frame_pos[-1] - 1]: 
+                with open(path, 'wb') as f: 
+                    f.write(data)
+                res_live = ResFile(path, lazy=lazy)
+                with open(path, 'r+b') as f: 
+                    f.truncate(cut)
+                    if cut > frame_pos[-1] - 8: # the last frame is rewritten by the other one
+                        f.seek(frame_pos[-1])
+                        f.write(data[frame_pos[-2]:frame_pos[-1]])
+                try: 
+                    res_live.refresh()
+                    raise TestFailed('Truncated file is refreshed')
+                except AstraResError: 
+                    pass
+                if lazy: 
+                    try: 
+                        res_live.frames[-1].profiles[-1]
+                        raise TestFailed('Frame of the truncated file is read')
+                    except AstraResError: 
+                        pass
+                else: 
+                    check_same_content(res, res_live)
+                del res_live
+    print('test refresh of the truncated file ', filename, ' passed')
+
+def test_iter_frames(filename): 
+    res = ResFile(filename)
+    n = 0
+    for fr1, fr2 in zip(res.frames, iter_frames(filename)): 
+        if fr1.prof_time_stamp != fr2.prof_time_stamp: 
+            raise TestFailed('Different time stamps')
+        for p1, p2 in zip(fr1.profiles, fr2.profiles): 
+            if not np.array_equal(p1.array, p2.array, equal_nan=True): 
+                raise TestFailed('Different profiles')
+        n += 1
+    if n != res.get_frame_count(): 
+        raise TestFailed('Wrong frame count')
+    
+    with ResFrameStream(filename) as stream: 
+        if stream.rad_names != res.rad_names: 
+            raise TestFailed('Different profile names')
+    print('test iter_frames ', filename, ' passed')
+
+def test_signals_matrix(filename): 
+    res = ResFile(filename)
+    sig = res.signals_matrix()
+    if sig.shape != (len(res.time_times), len(res.time_names)): 
+        raise TestFailed('Wrong shape of the signals matrix')
+    if not np.array_equal(sig[:, 0], res.time_times): 
+        raise TestFailed('First column is not time')
+    
+    for idx, name in enumerate(res.time_names): 
+        expected = [ts[idx] for fr in res.frames for ts in fr.time_slices]
+        if not np.array_equal(res.find_signal(name)[1], expected, equal_nan=True): 
+            raise TestFailed('Wrong signal %s' % name)
+    print('test signals matrix ', filename, ' passed')
+
+def test_profile_store(filename): 
+    res = ResFile(filename)
+    res_col = ResFile(filename, columnar=True)
+    check_same_content(res, res_col)
+    
+    store = res_col.profile_store()
+    if store.get_frame_count() != res.get_frame_count(): 
+        raise TestFailed('Wrong frame count in the profile store')
+    if not np.shares_memory(res_col.frames[-1].profiles[1].array, store.get_row(1)): 
+        raise TestFailed('Profiles of the frames are not the views of the profile store')
+    
+    name = res.rad_names[-1]
+    dense = res_col.profile_matrix(name)
+    for i in range(res.get_frame_count()): 
+        yy = res.find_profile(name, index=i)[2]
+        if not np.array_equal(dense[i, 0:len(yy)], yy, equal_nan=True): 
+            raise TestFailed('Wrong dense profile matrix')
+        if not np.all(np.isnan(dense[i, len(yy):])): 
+            raise TestFailed('Dense profile matrix is not padded with NaN')
+    
+    # lazy file: the store is gathered from the packets (mapped or read from the compressed file)
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = compress_res_file(filename, os.path.join(tmp, 'res.gz'))
+        for source, kwargs in [(filename, {}), (path, {}), (filename, {'profiles': [name]}), (path, {'profiles': [name]})]: 
+            lazy = ResFile(source, lazy=True, **kwargs)
+            lazy_store = lazy.profile_store()
+            if not np.array_equal(lazy_store.lengths, store.lengths): 
+                raise TestFailed('Wrong radial lengths of the lazy profile store')
+            for k in range(store.get_profile_count()): 
+                if lazy.projection.keeps_profile(k) and not np.array_equal(lazy_store.get_row(k), store.get_row(k), equal_nan=True): 
+                    raise TestFailed('Wrong profile store of the lazy file')
+            lazy.close()
+    print('test profile store ', filename, ' passed')
+
+def test_lazy_dequantization(filename): 
+    res = ResFile(filename)
+    res_raw = ResFile(filename, dequantize='lazy')
+    check_same_content(res, res_raw)
+    
+    # packets stay in the buffer of the file, ResProfile is created at the access
+    packed = ResFile(filename, dequantize='lazy', profiles=[res.rad_names[1]])
+    frame = packed.frames[-1]
+    if any(p is not None for p in frame.profiles._items): 
+        raise TestFailed('Profiles of the packed frame are created before the access')
+    if (frame.profiles[1].raw_array.base is None)or(frame.profiles[2] is not SKIPPED_PROFILE): 
+        raise TestFailed('Wrong profiles of the packed frame')
+    if not np.array_equal(frame.profiles[1].array, res.frames[-1].profiles[1].array, equal_nan=True): 
+        raise TestFailed('Wrong values of the packed profile')
+    
+    res32 = ResFile(filename, dequantize='lazy', dtype=np.float32, cache_values=False)
+    prof = res32.frames[0].profiles[1]
+    if prof._array is not None: 
+        raise TestFailed('Profile values are calculated before the access')
+    if prof.array.dtype != np.float32: 
+        raise TestFailed('Wrong dtype of the profile values')
+    if prof._array is not None: 
+        raise TestFailed('Profile values are cached')
+    if not np.allclose(prof.array, res.frames[0].profiles[1].array, equal_nan=True): 
+        raise TestFailed('Wrong float32 profile values')
+    print('test lazy dequantization ', filename, ' passed')
+
+def test_bulk_dequantization(filename): 
+    res = ResFile(filename, dequantize='lazy')
+    profiles = [p for fr in res.frames for p in fr.profiles]
+    values, bounds = dequantize_profiles(profiles)
+    for p, a, b in zip(profiles, bounds[:-1], bounds[1:]): 
+        expected = _convert(p.raw_array, p.down, p.scale)
+        if not np.array_equal(values[a:b], expected, equal_nan=True): 
+            raise TestFailed('Bulk dequantization differs from _convert')
+    print('test bulk dequantization ', filename, ' passed')
+
+def test_find_profiles(filename): 
+    res = ResFile(filename)
+    names = ['Te', 'Ne', res.rad_names[-1]]
+    rr, t, yy = res.find_profiles(names, time=1.0)
+    for name, y in zip(names, yy): 
+        if not np.array_equal(y, res.find_profile(name, time=1.0)[2], equal_nan=True): 
+            raise TestFailed('find_profiles differs from find_profile')
+    
+    frames = [0, res.get_frame_count() - 1]
+    rr, t, yy = res.find_profiles(names, index=frames)
+    if yy.shape[0:2] != (len(names), len(frames)): 
+        raise TestFailed('Wrong shape of the result of find_profiles')
+    for j, i in enumerate(frames): 
+        if not np.array_equal(yy[1, j], res.find_profile('Ne', index=i)[2], equal_nan=True): 
+            raise TestFailed('find_profiles differs from find_profile')
+    
+    res_lazy = ResFile(filename, lazy=True, dequantize='lazy')
+    decoded = sum(fr is not None for fr in res_lazy.frames._items)
+    rr_lazy, _, yy_lazy = res_lazy.find_profiles(names, index=frames)
+    if not (np.array_equal(rr_lazy, rr, equal_nan=True) and np.array_equal(yy_lazy, yy, equal_nan=True)): 
+        raise TestFailed('find_profiles of the lazy file differs')
+    if (res_lazy._profiles is not None)or(sum(fr is not None for fr in res_lazy.frames._items) > decoded + len(frames)): 
+        raise TestFailed('find_profiles decodes all the frames of the lazy file')
+    
+    tt, yy = res.find_signals(res.time_names[1:3])
+    if not np.array_equal(yy[1], res.find_signal(res.time_names[2])[1], equal_nan=True): 
+        raise TestFailed('find_signals differs from find_signal')
+    
+    try: 
+        res.find_profile('no such profile')
+        raise TestFailed('Unknown profile name is not detected')
+    except AstraResError: 
+        pass
+    print('test find_profiles ', filename, ' passed')
+
+def test_interp_profile(filename): 
+    res = ResFile(filename)
+    rr, t, y = res.find_profile('Te', index=2)
+    rho, yy = res.interp_profile('Te', [t, t], method='linear', rho=rr)
+    if yy.shape != (2, len(rr)) or not np.array_equal(yy[0], y): 
+        raise TestFailed('interp_profile at the time of the frame differs from find_profile')
+    
+    tt = res.rad_times
+    times = np.linspace(tt[0], tt[-1], 50)
+    rho, yy = res.interp_profile('Te', times, method='linear')
+    for j in [0, 17, 49]: 
+        i = min(np.searchsorted(tt, times[j]), len(tt) - 1)
+        y0 = res.interp_profile('Te', tt[max(i-1, 0)], rho=rho)[1][0]
+        y1 = res.interp_profile('Te', tt[i], rho=rho)[1][0]
+        if np.any(yy[j] < np.minimum(y0, y1) - 1e-12) or np.any(yy[j] > np.maximum(y0, y1) + 1e-12): 
+            raise TestFailed('interp_profile is out of the neighbouring frames')
+    print('test interp_profile ', filename, ' passed')
+
+def test_regrid(filename): 
+    res = ResFile(filename)
+    rho, yy = res.regrid('Te')
+    if yy.shape != (res.get_frame_count(), len(rho)): 
+        raise TestFailed('Wrong shape of the result of regrid')
+    for i in [0, res.get_frame_count() - 1]: 
+        rr, t, y = res.find_profile('Te', index=i)
+        if not np.allclose(yy[i], np.interp(rho, rr, y), rtol=0, atol=1e-12): 
+            raise TestFailed('regrid differs from np.interp')
+    if res.regrid('Te')[1] is not yy: 
+        raise TestFailed('regrid result is not cached')
+    
+    grid = np.linspace(0.0, rho[-1], 11)
+    rho, yy = res.regrid(None, grid)
+    if yy.shape != (len(res.rad_names), res.get_frame_count(), 11): 
+        raise TestFailed('Wrong shape of the result of regrid for all the profiles')
+    print('test regrid ', filename, ' passed')
+
+def test_load_many(paths, workers): 
+    runs = load_many(paths + ['res/no such file'], workers=workers)
+    if (runs.paths != paths)or(list(runs.errors) != ['res/no such file']): 
+        raise TestFailed('Wrong set of the loaded files')
+    for path in paths: 
+        res, run = ResFile(path), runs[path]
+        if (res.rad_names != run.rad_names)or(res.time_names != run.time_names): 
+            raise TestFailed('Names differ in the loaded file')
+        if not np.array_equal(res.signals_matrix(), run.signals_matrix(), equal_nan=True): 
+            raise TestFailed('Signals differ in the loaded file')
+        if not np.array_equal(res.profile_store().data, run.profile_store().data, equal_nan=True): 
+            raise TestFailed('Profiles differ in the loaded file')
+        if not np.array_equal(res.find_profile('Te', index=0)[2], run.find_profile('Te', index=0)[2]): 
+            raise TestFailed('find_profile differs in the loaded file')
+    print('test load_many ', workers, ' workers passed')
+
+def test_stack_signal(paths, name): 
+    runs = load_many(paths, workers=1)
+    times, yy, used = runs.stack_signal(name)
+    expected = [path for path in paths if name in runs[path].header.time_out_info.names]
+    if (used != expected)or(yy.shape != (len(expected), len(times))): 
+        raise TestFailed('Wrong runs in stack_signal')
+    for j, path in enumerate(used): 
+        tt, y = runs[path].find_signal(name)
+        ref = np.interp(times, tt, y)
+        ref[(times < tt[0]) | (times > tt[-1])] = np.nan
+        if not np.allclose(yy[j], ref, rtol=1e-12, atol=0, equal_nan=True): 
+            raise TestFailed('stack_signal differs from np.interp')
+    
+    # signals of the runs narrowed by the projection
+    _, yy_projected, used_projected = load_many(expected, workers=1, signals=[name]).stack_signal(name, times)
+    if (used_projected != expected)or(not np.array_equal(yy_projected, yy, equal_nan=True)): 
+        raise TestFailed('Wrong stack_signal of the projected runs')
+    if load_many(expected, workers=1, signals=['#time']).stack_signal(name, times)[2] != []: 
+        raise TestFailed('Unrequested signal is stacked')
+    
+    run = load_many(expected[0:1], workers=1, profiles=['Te'])[expected[0]]
+    try: 
+        run.find_profile('Ne', index=0)
+        raise TestFailed('Unrequested profile is found in the detached run')
+    except AstraResError: 
+        pass
+    run.find_profile('Te', index=0)
+    print('test stack_signal ', name, ' passed')
+
+def test_export(filename, format, compress): 
+    res = ResFile(filename)
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'exported')
+        res.export(path, format, compress)
+        loaded = load_export(path)
+        if (loaded.rad_names != res.rad_names)or(loaded.time_names != res.time_names): 
+            raise TestFailed('Names differ in the exported file')
+        for a, b in [(res.signals_matrix(), loaded.signals_matrix()), 
+                     (res.profile_store().data, loaded.profile_store().data), 
+                     (res.const_matrix(), loaded.const_matrix()), 
+                     (res.rad_times, loaded.rad_times), (res.time_times, loaded.time_times)]: 
+            if not np.array_equal(a, b, equal_nan=True): 
+                raise TestFailed('Arrays differ in the exported file')
+        if (format == 'npz')and(not compress)and(not isinstance(loaded.profile_store().data, np.memmap)): 
+            raise TestFailed('Uncompressed npz is not memory-mapped')
+        del loaded
+    print('test export ', filename, format, compress, ' passed')
+
+def test_quantized_export(filename, format): 
+    res = ResFile(filename)
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'archive')
+        res.export(path, format, quantized=True)
+        loaded = load_export(path)
+        store = loaded.profile_store()
+        if store.codes.dtype != np.int16: 
+            raise TestFailed('Profiles are not kept as int16 codes in the archive')
+        if not np.array_equal(loaded.find_profile('Te', index=1)[2], res.find_profile('Te', index=1)[2]): 
+            raise TestFailed('Profile differs in the archive')
+        if np.count_nonzero(store._ready) != 2:   # '#radius' and 'Te'
+            raise TestFailed('Profiles of the archive are not dequantized lazily')
+        if not np.array_equal(store.data, res.profile_store().data, equal_nan=True): 
+            raise TestFailed('Profiles differ in the archive')
+        del loaded, store
+    print('test quantized export ', filename, format, ' passed')
+
+def test_convert_dir(): 
+    with tempfile.TemporaryDirectory() as tmp: 
+        with open(os.path.join(tmp, 'notes.txt'), 'w') as f: 
+            f.write('not a res-file')
+        for name in ['GG2', 'test']: 
+            with open('res/' + name, 'rb') as src, open(os.path.join(tmp, name), 'wb') as dst: 
+                dst.write(src.read())
+        
+        written, errors = convert_dir(tmp, workers=1)
+        if (len(written) != 2)or(list(errors) != [os.path.join(tmp, 'notes.txt')]): 
+            raise TestFailed('Wrong files are converted by convert_dir')
+        if load_export(os.path.join(tmp, 'GG2.npz')).get_frame_count() != ResFile('res/GG2').get_frame_count(): 
+            raise TestFailed('Wrong content of the converted file')
+    print('test convert_dir passed')
+
+def test_header_only(filename): 
+    res = ResFile(filename)
+    meta = ResFile(filename, frames=False)
+    if (meta.get_frame_count() != 0)or(meta.time_range != res.time_range): 
+        raise TestFailed('Wrong time range of the header-only ResFile')
+    if (meta.rad_names != res.rad_names)or(meta.const_names != res.const_names): 
+        raise TestFailed('Names differ in the header-only ResFile')
+    
+    # incomplete last frame
+    with open(filename, 'rb') as f: 
+        data = f.read()
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'cut')
+        with open(path, 'wb') as f: 
+            f.write(data[0:len(data) - 100])
+        if ResFile(path, frames=False).time_range != ResFile(path).time_range: 
+            raise TestFailed('Wrong time range of the header-only ResFile with incomplete frame')
+    print('test header only ', filename, ' passed')
+
+def test_time_range(filename, lazy): 
+    res = ResFile(filename)
+    tt = res.rad_times
+    k = len(tt)//3
+    t0, t1 = tt[k], tt[min(2*k, len(tt) - 1)]
+    win = ResFile(filename, time_range=(t0, t1), lazy=lazy)
+    idx = np.flatnonzero((tt >= t0)&(tt <= t1))
+    if not np.array_equal(win.rad_times, tt[idx]): 
+        raise TestFailed('Wrong frames in the time window')
+    for j, i in enumerate(idx): 
+        if not np.array_equal(win.find_profile('Te', index=j)[1], res.find_profile('Te', index=int(i))[1]): 
+            raise TestFailed('Wrong profiles in the time window')
+    if ResFile(filename, time_range=(tt[-1] + 1.0, tt[-1] + 2.0)).get_frame_count() != 0: 
+        raise TestFailed('Frames after the end of the file')
+    try: 
+        win.refresh()
+        raise TestFailed('ResFile with the time range is refreshed')
+    except AstraResError: 
+        pass
+    print('test time range ', filename, ' passed')
+
+def test_projection(filename, **kwargs): 
+    res = ResFile(filename)
+    names, signals = [res.rad_names[-1], res.rad_names[8]], [res.time_names[5], res.time_names[2]]
+    part = ResFile(filename, profiles=names, signals=signals, **kwargs)
+    if part.rad_names != res.rad_names: 
+        raise TestFailed('Profile names are changed by the projection')
+    if part.time_names != [res.time_names[0]] + signals: 
+        raise TestFailed('Wrong signal names of the projection')
+    if not np.array_equal(part.signals_matrix(), res.signals_matrix()[:, [0, 5, 2]], equal_nan=True): 
+        raise TestFailed('Wrong signals of the projection')
+    for name in names + ['#radius']: 
+        if not np.array_equal(part.profile_matrix(name), res.profile_matrix(name), equal_nan=True): 
+            raise TestFailed('Wrong profile ' + name + ' of the projection')
+    for name in [res.rad_names[9]]: 
+        try: 
+            part.find_profile(name, index=0)
+            raise TestFailed('Unrequested profile is returned')
+        except AstraResError: 
+            pass
+    print('test projection ', filename, kwargs, ' passed')
+
+def test_compressed(filename): 
+    res = ResFile(filename)
+    with open(filename, 'rb') as f: 
+        data = f.read()
+    with tempfile.TemporaryDirectory() as tmp: 
+        for name, module in [('res.gz', gzip), ('res.xz', lzma)]: 
+            path = os.path.join(tmp, name)
+            with module.open(path, 'wb') as f: 
+                f.write(data)
+            for kwargs in [{}, {'lazy': True}]: 
+                cres = ResFile(path, **kwargs)
+                if not np.array_equal(cres.signals_matrix(), res.signals_matrix(), equal_nan=True): 
+                    raise TestFailed('Wrong signals of the compressed res-file')
+                for i in reversed(range(res.get_frame_count())): 
+                    if not np.array_equal(cres.find_profile('Te', index=i)[2], res.find_profile('Te', index=i)[2]): 
+                        raise TestFailed('Wrong profiles of the compressed res-file')
+            if ResFile(path, frames=False).time_range != res.time_range: 
+                raise TestFailed('Wrong time range of the compressed res-file')
+        
+        # members of compress_res_file: their starts are kept in the sidecar index
+        member_size = 1 << 14
+        tt = res.rad_times
+        for kind in ['gzip', 'xz']: 
+            path = compress_res_file(filename, os.path.join(tmp, 'members'), kind, member_size)
+            with ResFile(path, lazy=True, index_cache=True) as cres: 
+                check_same_res(cres, res, 'Wrong content of the multi-member file')
+            with np.load(index_cache_path(path)) as data_index: 
+                points = data_index['seek_points']
+            if not np.array_equal(points[:, 0], np.arange(0, len(data), member_size)): 
+                raise TestFailed('Wrong seek points in the sidecar index')
+            
+            cf = CompressedFile(FileSource(path), kind)
+            cf.add_seek_points(points.tolist())
+            cf.seek(len(data) - 100)
+            if (cf.read(100) != data[-100:])or(cf.decompressed > member_size): 
+                raise TestFailed('Compressed file is not read from the nearest member')
+            cf.seek(10)
+            if cf.read(100) != data[10:110]: 
+                raise TestFailed('Wrong backward seek in the compressed file')
+            cf.close()
+            
+            window = (tt[len(tt)//2], tt[-1])
+            check_same_res(ResFile(path, time_range=window), ResFile(filename, time_range=window), 
+                           'Wrong time window of the multi-member file')
+    print('test compressed ', filename, ' passed')
+
+class RangeHandler(SimpleHTTPRequestHandler): 
+    # stand-in of the remote storage: files of the current directory with the range requests
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args): 
+        pass
+
+    def do_GET(self): 
+        path = self.translate_path(self.path)
+        m = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if (m is None)or(not os.path.isfile(path)): 
+            return SimpleHTTPRequestHandler.do_GET(self)
+        if self.path.endswith('?norange')and(m.group(0) != 'bytes=0-0'): 
+            # server that ignores Range after the probe: the whole file with 200
+            return SimpleHTTPRequestHandler.do_GET(self)
+        size = os.path.getsize(path)
+        a, b = int(m.group(1)), min(int(m.group(2)), size - 1)
+        with open(path, 'rb') as f: 
+            f.seek(a)
+            data = f.read(b - a + 1)
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes %d-%d/%d' % (a, b, size))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def check_same_res(res, ref, message): 
+    if (res.rad_names != ref.rad_names)or(not np.array_equal(res.rad_times, ref.rad_times)): 
+        raise TestFailed(message)
+    if not np.array_equal(res.signals_matrix(), ref.signals_matrix(), equal_nan=True): 
+        raise TestFailed(message)
+    for k in range(len(ref.rad_names)): 
+        if not np.array_equal(res.profile_matrix(k), ref.profile_matrix(k), equal_nan=True): 
+            raise TestFailed(message)
+
+def test_byte_sources(filename): 
+    res = ResFile(filename)
+    with open(filename, 'rb') as f: 
+        data = f.read()
+    
+    cache = BlockCache(FileSource(filename), block_size=4096, max_blocks=16)
+    for source in [data, BytesSource(data), MmapSource(filename), FileSource(filename), cache]: 
+        for kwargs in [{}, {'lazy': True}]: 
+            check_same_res(ResFile(source, **kwargs), res, 'Wrong content read from ' + type(source).__name__)
+    if cache.fetches >= cache.hits: 
+        raise TestFailed('Reads are not coalesced by BlockCache')
+    
+    class NoReadSource(ByteSource): 
+        size = len(data)
+    try: 
+        NoReadSource()
+        raise TestFailed('ByteSource without read_at is created')
+    except TypeError: 
+        pass
+    
+    tt = res.rad_times
+    window = (tt[len(tt)//4], tt[len(tt)//2])
+    expected = ResFile(filename, time_range=window).rad_times
+    if not np.array_equal(ResFile(memoryview(b'XXXX' + data)[4:], time_range=window).rad_times, expected): 
+        raise TestFailed('Wrong time window of the memoryview with an offset')
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), 
+                                 functools.partial(RangeHandler, directory=os.path.dirname(os.path.abspath(filename))))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try: 
+        url = 'http://127.0.0.1:%d/%s' % (server.server_address[1], os.path.basename(filename))
+        check_same_res(ResFile(url), res, 'Wrong content read by HTTP')
+        check_same_res(ResFile(url, lazy=True), res, 'Wrong content read by HTTP (lazy)')
+        if ResFile(url, frames=False).time_range != res.time_range: 
+            raise TestFailed('Wrong time range read by HTTP')
+        tt = res.rad_times
+        win = ResFile(url, time_range=(tt[2], tt[4]))
+        if not np.array_equal(win.rad_times, tt[(tt >= tt[2])&(tt <= tt[4])]): 
+            raise TestFailed('Wrong time window read by HTTP')
+        try: 
+            ResFile(url + '?norange')
+            raise TestFailed('Reply without the range is accepted')
+        except AstraResError: 
+            pass
+        source = HttpSource(url + '?norange')
+        try: 
+            source.read_at(1000, 10)
+            raise TestFailed('Reply without the range is accepted')
+        except AstraResError: 
+            pass
+        source.close()
+    finally: 
+        server.shutdown()
+        server.server_close()
+    print('test byte sources ', filename, ' passed')
+
+def test_diff(filename, other): 
+    res = ResFile(filename)
+    d = diff(ResFile(filename, lazy=True), res)
+    if not d.equal: 
+        raise TestFailed('Different runs: ' + d.report())
+    
+    changed = ResFile(filename)
+    store = changed.profile_store()
+    k = max(k for k in range(1, store.get_profile_count()) if np.nanmax(np.abs(store.get_row(k))) > 0)
+    name = changed.rad_names[k]
+    store.get_row(k)[:] *= 1.01
+    d = diff(changed, res)
+    if d.equal or(d.failed() != [('profiles', name)]): 
+        raise TestFailed('Changed profile is not found: ' + d.report())
+    if d.report().count('\n') != 1: 
+        raise TestFailed('Wrong report: ' + d.report())
+    
+    d = diff(ResFile(other), res)
+    if d.equal or(not d.header)or(not d.model): 
+        raise TestFailed('Different runs are not found')
+    d.report()
+    
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'ragged')
+        write_synthetic_res(path, n_frames=30, n_profiles=5, n_rho=20, n_signals=4, ragged_every=4)
+        full = ResFile(path)
+        tt = full.rad_times
+        win = ResFile(path, time_range=(tt[5], tt[20]))
+        d = diff(win, full)
+        if d.failed()or(d.frames['rad'] != (win.get_frame_count(), len(tt), win.get_frame_count())): 
+            raise TestFailed('Wrong comparison with the time window: ' + d.report())
+    print('test diff ', filename, ' passed')
+
+def test_path(filename): 
+    res = ResFile(filename)
+    path = pathlib.Path(filename)
+    check_same_content(res, ResFile(path))
+    check_same_content(res, ResFile(path, lazy=True))
+    tt = res.rad_times
+    win = ResFile(path, time_range=(tt[0], tt[-1]))
+    if not np.array_equal(win.rad_times, tt): 
+        raise TestFailed('Wrong time window of pathlib.Path')
+    try: 
+        check_same_content(res, ResFile(path, index_cache=True))
+        if not os.path.exists(index_cache_path(path)): 
+            raise TestFailed('Index file is not created for pathlib.Path')
+    finally: 
+        if os.path.exists(index_cache_path(filename)): 
+            os.remove(index_cache_path(filename))
+    with tempfile.TemporaryDirectory() as tmp: 
+        ResFile(path).export(pathlib.Path(tmp) / 'res.npz')
+        if load_export(os.path.join(tmp, 'res.npz')).get_frame_count() != res.get_frame_count(): 
+            raise TestFailed('Wrong export of pathlib.Path')
+    print('test path ', filename, ' passed')
+
+def test_catalog(): 
+    with tempfile.TemporaryDirectory() as tmp: 
+        os.makedirs(os.path.join(tmp, 'sub'))
+        for name, dest in [('GG2', 'GG2'), ('t15conOH3', 'sub/t15conOH3'), ('33957a', '33957a')]: 
+            with open('res/' + name, 'rb') as src, open(os.path.join(tmp, dest), 'wb') as dst: 
+                dst.write(src.read())
+        with open(os.path.join(tmp, 'notes.txt'), 'w') as f: 
+            f.write('not a res-file')
+        
+        with ResCatalog(os.path.join(tmp, 'runs.db')) as catalog: 
+            if catalog.scan(tmp, workers=1) != (4, 0): 
+                raise TestFailed('Wrong number of the scanned files')
+            if catalog.scan(tmp, workers=1) != (0, 4): 
+                raise TestFailed('Unchanged files are scanned again')
+            if list(catalog.errors()) != [os.path.join(tmp, 'notes.txt')]: 
+                raise TestFailed('Wrong errors of the catalogue')
+            
+            gg2 = os.path.join(tmp, 'GG2')
+            if catalog.query(version='7*', signals=['<ne>'], profiles='Te') != [gg2]: 
+                raise TestFailed('Wrong result of the query by version and names')
+            if len(catalog.query(t_end_min=0.5)) != 1: 
+                raise TestFailed('Wrong result of the query by the time range')
+            opened = catalog.open(eq_name='*t15*', resfile_kwargs={'frames': False})
+            if sorted(res.header.rd_name for res in opened) != ['t15-3cen', 't15m10001']: 
+                raise TestFailed('Wrong files are opened by the query')
+            
+            os.remove(gg2)
+            catalog.scan(tmp, workers=1)
+            if gg2 in catalog.query(): 
+                raise TestFailed('Deleted file is not removed from the catalogue')
+            sub = os.path.join(tmp, 'sub', 't15conOH3')
+            catalog.scan(tmp, recursive=False, workers=1)
+            if sub not in catalog.query(): 
+                raise TestFailed('File of the subdirectory is removed by the non-recursive scan')
+            if catalog.scan(pathlib.Path(tmp), workers=1) != (0, 3): 
+                raise TestFailed('Wrong scan of pathlib.Path')
+            
+            # only the database itself is skipped, not the names with its prefix
+            run = os.path.join(tmp, 'runs.db_2023', '33957a')
+            os.makedirs(os.path.dirname(run))
+            with open('res/33957a', 'rb') as src, open(run, 'wb') as dst: 
+                dst.write(src.read())
+            catalog.scan(tmp, workers=1)
+            if run not in catalog.query(): 
+                raise TestFailed('Directory with the name of the database is skipped')
+            if any(path.startswith(catalog.db_path) for path in catalog.errors()): 
+                raise TestFailed('Database is scanned')
+            
+            # listed, but can not be stat'ed (like the file deleted during the scan)
+            os.symlink(os.path.join(tmp, 'deleted'), os.path.join(tmp, 'dangling'))
+            catalog.scan(tmp, workers=1)
+            if os.path.join(tmp, 'dangling') in catalog.query() + list(catalog.errors()): 
+                raise TestFailed('Missing file is catalogued')
+    print('test catalog passed')
+
+def test_stats(filename): 
+    if ResFile(filename).stats is not None: 
+        raise TestFailed('Statistics are not disabled by default')
+    
+    events = []
+    res = ResFile(filename, hook=lambda phase, stats: events.append(phase))
+    stats = res.stats
+    if (events[0:3] != ['text', 'header', 'frames'])or(events[-1] != 'done'): 
+        raise TestFailed('Wrong phases reported to the hook')
+    if sum(stats.phase_bytes.values()) != os.path.getsize(filename): 
+        raise TestFailed('Wrong number of the processed bytes')
+    if (stats.frames != res.get_frame_count())or(stats.reads == 0): 
+        raise TestFailed('Wrong counters')
+    if stats.probes.get('ProfileNotFound', 0) != res.get_frame_count() - 1: 
+        raise TestFailed('Wrong number of ProfileNotFound probes')
+    print('test stats ', filename, ' passed')
+
+def test_synthetic(): 
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'synthetic')
+        write_synthetic_res(path, n_frames=30, n_profiles=5, n_rho=20, n_signals=4, ragged_every=7)
+        res = ResFile(path)
+        if (res.get_frame_count() != 30)or(len(res.rad_names) != 7 + 5)or(len(res.time_names) != 1 + 4): 
+            raise TestFailed('Wrong structure of the synthetic res-file')
+        lengths = res.profile_store().lengths
+        if (lengths[6] != 30)or(np.count_nonzero(lengths == 20) != 26): 
+            raise TestFailed('Wrong ragged meshes of the synthetic res-file')
+        rr, t, yy = res.find_profile('Te', index=6)
+        if (abs(rr[-1] - 1.0) > 1e-12)or(t != 0.007): 
+            raise TestFailed('Wrong content of the synthetic res-file')
+        if (len(res.header._packet1) == 4)or(res.header.ngr != 2)or(len(res.header.namex) != 67): 
+            raise TestFailed('Wrong second header packet of the synthetic res-file')
+        
+        write_synthetic_res(path, n_frames=0)
+        if ResFile(path).get_frame_count() != 0: 
+            raise TestFailed('Wrong synthetic res-file without frames')
+    print('test synthetic res-file passed')
+
+def test_ragged_profile_store(): 
+    store = ProfileStore(2)
+    store.append([[np.arange(3.0), np.arange(3.0) + 10], 
+                  [np.arange(5.0), np.arange(5.0) + 10]])
+    dense = store.dense(1)
+    expected = np.array([[10, 11, 12, np.nan, np.nan], [10, 11, 12, 13, 14]])
+    if not np.array_equal(dense, expected, equal_nan=True): 
+        raise TestFailed('Wrong dense matrix for different radial lengths')
+    if not np.array_equal(store.take([0, 1], [1])[:, 0, 4], [4, 14]): 
+        raise TestFailed('Wrong ProfileStore.take')
+    
+    # runs of the regular frames and the irregular ones (short and missing profiles)
+    store.append([[np.arange(5.0), np.arange(5.0) + 20], [np.arange(5.0), np.arange(5.0) + 30], 
+                  [np.arange(4.0), np.arange(2.0) + 40], [np.arange(2.0)], 
+                  [np.arange(2.0), np.arange(2.0) + 50]])
+    expected = [[10, 11, 12], [10, 11, 12, 13, 14], [20, 21, 22, 23, 24], [30, 31, 32, 33, 34], 
+                [40, 41, np.nan, np.nan], [np.nan, np.nan], [50, 51]]
+    for i, yy in enumerate(expected): 
+        if not np.array_equal(store.get(1, i), yy, equal_nan=True): 
+            raise TestFailed('Wrong profile of the frame %d in ProfileStore' % i)
+    print('test ragged profile store passed')
+
+
 def test_GG2(): 
     test_resfile("res/GG2", '7', '#last')  # ??? Unknown profile at the end ???
 
@@ -45,3 +836,73 @@ test_t15conOH3()
 
 test_GG2()  # WARNING is OK
 test_test()
+
+test_mmap("res/33957a")
+test_mmap("res/test")
+
+test_lazy("res/GG2")
+test_lazy("res/t15conOH3")
+
+test_index_cache("res/test")
+
+test_refresh("res/t15conOH3")
+test_refresh("res/test", lazy=True)
+test_refresh_truncated("res/t15conOH3")
+
+test_iter_frames("res/t15conOH3")
+
+test_signals_matrix("res/GG2")
+
+test_profile_store("res/t15conOH3")
+test_profile_store("res/GG2")
+
+test_lazy_dequantization("res/33957a")
+
+test_bulk_dequantization("res/t15conOH3")
+
+test_find_profiles("res/t15conOH3")
+test_ragged_profile_store()
+
+test_interp_profile("res/t15conOH3")
+test_regrid("res/t15conOH3")
+
+test_load_many(["res/t15conOH3", "res/GG2"], workers=1)
+if multiprocessing.get_start_method() == 'fork':  # this script is not import-safe for 'spawn'
+    test_load_many(["res/t15conOH3", "res/GG2", "res/test"], workers=2)
+test_export("res/t15conOH3", 'npz', False)
+test_export("res/GG2", 'npz', True)
+if h5py is not None: 
+    test_export("res/t15conOH3", 'hdf5', False)
+    test_export("res/GG2", 'hdf5', True)
+test_quantized_export("res/GG2", 'npz')
+if h5py is not None: 
+    test_quantized_export("res/t15conOH3", 'hdf5')
+test_convert_dir()
+
+test_header_only("res/t15conOH3")
+test_header_only("res/GG2")
+
+test_time_range("res/t15conOH3", False)
+test_time_range("res/GG2", True)
+test_time_range("res/33957a", False)
+
+test_projection("res/t15conOH3")
+test_projection("res/GG2", lazy=True)
+test_projection("res/test", use_mmap=True)
+
+test_compressed("res/t15conOH3")
+test_compressed("res/GG2")
+
+test_byte_sources("res/t15conOH3")
+test_byte_sources("res/GG2")
+
+test_diff("res/GG2", "res/t15conOH3")
+test_diff("res/t15conOH3", "res/33957a")
+
+test_path("res/t15conOH3")
+
+test_catalog()
+test_synthetic()
+test_stats("res/t15conOH3")
+
+test_stack_signal(["res/t15conOH3", "res/GG2", "res/test", "res/33957a"], '<ne>')